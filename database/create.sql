@@ -200,10 +200,118 @@ CREATE TABLE Route (
 	FOREIGN KEY (CostCenter) REFERENCES CostCenter(Name)
 );
 
+CREATE INDEX RouteSource ON Route(Source);
+
+CREATE INDEX RouteDestination ON Route(Destination);
+
+CREATE INDEX NetworkNodeCostCenter ON NetworkNode(CostCenter);
+
+CREATE INDEX InventoryNetworkNode ON Inventory(NetworkNode);
+
+CREATE INDEX DemandCustomer ON Demand(Customer, Material);
+
+CREATE INDEX ProducedMaterialSite ON ProducedMaterial(ProductionSite, MaterialName);
+
+CREATE INDEX DisassembledMaterialPlant ON DisassembledMaterial(RecoveryPlant);
+
+CREATE INDEX InverseBOMPlant ON InverseBOM(RecoveryPlant, Product);
+
+CREATE INDEX BOMComponent ON BOM(Component);
+
+CREATE TABLE Scenario (
+	Name TEXT PRIMARY KEY,
+	Description TEXT
+) WITHOUT ROWID;
+
+CREATE TABLE ScenarioValidity (
+	Scenario TEXT NOT NULL,
+	Operation TEXT NOT NULL,
+	NetworkNode TEXT NOT NULL,
+	Start DATE,
+	End DATE,
+	FOREIGN KEY (Scenario) REFERENCES Scenario(Name),
+	FOREIGN KEY (NetworkNode) REFERENCES NetworkNode(Name)
+);
+
+CREATE TABLE ScenarioRoute (
+	Scenario TEXT NOT NULL,
+	Operation TEXT NOT NULL,
+	Source TEXT NOT NULL,
+	Destination TEXT NOT NULL,
+	TransportMode  TEXT NOT NULL,
+	CostCenter TEXT,
+	FOREIGN KEY (Scenario) REFERENCES Scenario(Name),
+	FOREIGN KEY (Source) REFERENCES NetworkNode(Name),
+	FOREIGN KEY (Destination) REFERENCES NetworkNode(Name),
+	FOREIGN KEY (TransportMode) REFERENCES TransportMode(Name),
+	FOREIGN KEY (CostCenter) REFERENCES CostCenter(Name)
+);
+
+CREATE TABLE ScenarioInventory (
+	Scenario TEXT NOT NULL,
+	Operation TEXT NOT NULL,
+	Material TEXT NOT NULL,
+	NetworkNode TEXT NOT NULL,
+	Quantity INTEGER,
+	Price REAL,
+	FOREIGN KEY (Scenario) REFERENCES Scenario(Name),
+	FOREIGN KEY (Material) REFERENCES Material(Name),
+	FOREIGN KEY (NetworkNode) REFERENCES NetworkNode(Name)
+);
+
+CREATE TABLE ScenarioDemand (
+	Scenario TEXT NOT NULL,
+	Operation TEXT NOT NULL,
+	Customer TEXT NOT NULL,
+	Material TEXT NOT NULL,
+	Frequency INTEGER,
+	Quantity INTEGER,
+	IsBacklog INTEGER,
+	AdditionalTrend REAL,
+	MultiplicativeTrend REAL,
+	Duedate INTEGER,
+	WasteProduction REAL,
+	FOREIGN KEY (Scenario) REFERENCES Scenario(Name),
+	FOREIGN KEY (Customer) REFERENCES Customer(NetworkNode),
+	FOREIGN KEY (Material) REFERENCES Material(Name),
+	FOREIGN KEY (Quantity) REFERENCES Distribution(ID)
+);
+
+CREATE TABLE ScenarioProducedMaterial (
+	Scenario TEXT NOT NULL,
+	Operation TEXT NOT NULL,
+	ProductionSite TEXT NOT NULL,
+	MaterialName TEXT NOT NULL,
+	Cost REAL,
+	Time INTEGER,
+	CapacityUsage INTEGER,
+	Price REAL,
+	OperationPropertyID INTEGER,
+	FOREIGN KEY (Scenario) REFERENCES Scenario(Name),
+	FOREIGN KEY (ProductionSite) REFERENCES NetworkNode(Name),
+	FOREIGN KEY (MaterialName) REFERENCES Material(Name),
+	FOREIGN KEY (OperationPropertyID) REFERENCES OperationPropertyLink(ID)
+);
+
+CREATE TABLE SimulationRun (
+	ID INTEGER PRIMARY KEY,
+	Scenario TEXT,
+	Seed TEXT,
+	Horizon INTEGER NOT NULL,
+	StartTime DATE,
+	Timestamp DATETIME NOT NULL
+);
+
 CREATE TABLE SimulationResult (
 	ID INTEGER PRIMARY KEY,
+	RunID INTEGER,
 	CostCenter TEXT NOT NULL,
 	KPI TEXT NOT NULL,
 	Value REAL NOT NULL,
+	FOREIGN KEY (RunID) REFERENCES SimulationRun(ID),
 	FOREIGN KEY (CostCenter) REFERENCES CostCenter(Name)
-);
\ No newline at end of file
+);
+
+CREATE INDEX SimulationResultRun ON SimulationResult(RunID, CostCenter, KPI);
+
+CREATE INDEX SimulationRunScenario ON SimulationRun(Scenario);
\ No newline at end of file
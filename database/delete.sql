@@ -1,3 +1,9 @@
+DROP TABLE ScenarioValidity;
+DROP TABLE ScenarioRoute;
+DROP TABLE ScenarioInventory;
+DROP TABLE ScenarioDemand;
+DROP TABLE ScenarioProducedMaterial;
+DROP TABLE Scenario;
 DROP TABLE MaterialPropertyLink;
 DROP TABLE MaterialProperty;
 DROP TABLE Validity;
@@ -19,6 +25,7 @@ DROP TABLE NetworkNode;
 DROP TABLE Disturbance;
 DROP TABLE Distribution;
 DROP TABLE SimulationResult;
+DROP TABLE SimulationRun;
 DROP TABLE CostCenter;
 DROP TABLE OperationPropertyLink;
 DROP TABLE OperationPropertyClass;
@@ -0,0 +1,67 @@
+"""
+Copyright   :   Copyright 2024, HUN-REN SZTAKI
+File name   :   candidates.py
+Description :   Precomputed supplier candidates of the route selection for the COPROLOOPS simulation
+
+Revision history:
+Date            Author          Comment
+----------------------------------------------------------
+18/10/2026      SZTAKI          Initial version
+"""
+
+
+class Candidate:
+    """ Candidate route of a selection with its static costs
+        price: unit price of the material at the candidate node (0 if the selection does not depend on it)
+        cost: static transportation cost paid by the selecting node
+    """
+    __slots__ = ('route', 'node', 'price', 'cost', 'index')
+
+    def __init__(self, route, node, price, cost):
+        self.route = route
+        self.node = node
+        self.price = price
+        self.cost = cost
+        # Position in the route list for breaking ties like the full route scan
+        self.index = None
+
+
+class CandidateList:
+    """ Valid candidates sorted by the static cost
+        The lists are dropped by DataStructure.clear_candidates when a node opens or closes.
+    """
+    def __init__(self, candidates):
+        for i, candidate in enumerate(candidates):
+            candidate.index = i
+        candidates = [candidate for candidate in candidates if candidate.node.valid]
+        self.candidates = sorted(candidates, key=lambda candidate: candidate.cost)
+        self.min_price = min((candidate.price for candidate in candidates), default=0)
+
+
+def get_candidates(data, key, build):
+    """ Candidate list of a selection, built by build() at the first use and cached in the data structure
+        key: identifies the selection, e.g. ('supplier', plant, material)
+    """
+    candidates = data.candidates.get(key)
+    if candidates is None:
+        candidates = CandidateList(build())
+        data.candidates[key] = candidates
+    return candidates
+
+
+def select_cheapest(candidates, quantity, is_feasible=None):
+    """ Selecting the route of the feasible candidate with the lowest quantity * price + cost
+        The scan stops when no further candidate can be cheaper, ties are broken by the route order.
+    """
+    best = None
+    best_cost = None
+    for candidate in candidates.candidates:
+        if best is not None and quantity * candidates.min_price + candidate.cost > best_cost:
+            break
+        if is_feasible is not None and not is_feasible(candidate.node):
+            continue
+        cost = quantity * candidate.price + candidate.cost
+        if best is None or cost < best_cost or (cost == best_cost and candidate.index < best.index):
+            best = candidate
+            best_cost = cost
+    return best.route if best is not None else None
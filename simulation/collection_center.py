@@ -9,6 +9,7 @@ Date            Author          Comment
 29/11/2024      Egri            Initial version
 """
 import network_nodes
+from candidates import Candidate, get_candidates, select_cheapest
 
 # Multipliers for the inventory policy (related to the average demand)
 S_MULTIPLIER = 10
@@ -26,33 +27,20 @@ def getS(cc, history):
     """ Sample target level for the collection center
         Average demand multiplied by a constant, independently of the collection center
     """
-    sum = 0
-    first = None
-    last = None
-    for demand in history:
-        time = demand['time']
-        quantity = demand['quantity']
-        sum += quantity
-        if first is None or time < first:
-            first = time
-        if last is None or time > last:
-            last = time
-    if first is None or last is None:
-        return 0
-    return round(S_MULTIPLIER * sum / (last - first + 1))
+    return round(S_MULTIPLIER * history.get_average())
+
+
+def get_plants(cc, material, data):
+    """ Recovery plants disassembling the material """
+    candidates = []
+    for route in cc.route_starts:
+        node = route.destination_node
+        if isinstance(node, network_nodes.RecoveryPlant) and material in node.disassembled_materials.keys():
+            candidates.append(Candidate(route, node, 0, route.transport_cost))
+    return candidates
 
 
 def select_plant(cc, material, data):
     """ Selecting recovery plant """
-    best_route = None
-    best_cost = None
-    for route in cc.route_starts:
-        node = data.network_nodes[route.destination]
-        if isinstance(node, network_nodes.RecoveryPlant) and material in node.disassembled_materials.keys() and node.is_valid(data.env.now):
-            transport_mode = data.transport_modes[route.mode]
-            distance = data.get_distance(cc.name, route.destination)
-            cost = transport_mode.fixedcost + transport_mode.distancecost * distance
-            if best_route is None or cost < best_cost:
-                best_route = route
-                best_cost = cost
-    return best_route
+    candidates = get_candidates(data, ('recovery plant', cc.name, material), lambda: get_plants(cc, material, data))
+    return select_cheapest(candidates, 0)
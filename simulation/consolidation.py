@@ -0,0 +1,39 @@
+"""
+Copyright   :   Copyright 2024, HUN-REN SZTAKI
+File name   :   consolidation.py
+Description :   Sample shipment consolidation logic for the COPROLOOPS simulation
+
+Revision history:
+Date            Author          Comment
+----------------------------------------------------------
+18/10/2026      SZTAKI          Initial version
+"""
+
+# Shipments on the same route within the window (in days) are transported together (None: no consolidation)
+CONSOLIDATION_WINDOW = None
+# Load limits of the transport modes, e.g. {'Truck': {'volume': 80, 'mass': 24000}}
+LOAD_LIMITS = dict()
+
+
+def is_consolidated(route):
+    """ Checking whether the shipments of the route are consolidated """
+    return CONSOLIDATION_WINDOW is not None and route is not None
+
+
+def get_window(route):
+    """ Time between the first shipment of a load and its departure """
+    return CONSOLIDATION_WINDOW
+
+
+def fits(load, quantity, material):
+    """ Checking whether the shipment can be added to the load without exceeding the limits of the transport mode
+        A single shipment larger than the limits is transported alone.
+    """
+    limits = LOAD_LIMITS.get(load.route.mode)
+    if limits is None or len(load.orders) == 0:
+        return True
+    if 'volume' in limits and load.volume + quantity * material.volume > limits['volume']:
+        return False
+    if 'mass' in limits and load.mass + quantity * material.mass > limits['mass']:
+        return False
+    return True
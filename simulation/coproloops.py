@@ -10,58 +10,59 @@ Date            Author          Comment
 02/09/2025      Egri            First public version
 """
 
-import datastruct
-import simpy
 import datetime
-from log import Log
+from log import LogPolicy
 import presentation
+from result_store import ResultStore
+from simulation_run import SimulationRun
 
 # Simulation model data
 DATABASE = 'simulationdb'
 # Simulation horizon
 HORIZON = 365
+# Sink for streaming the simulation log, e.g. log_sink.SQLiteSink('log.db') or log_sink.CSVSink('log.csv.gz')
+# None keeps the whole log in the memory for the dashboard
+LOG_SINK = None
+# Log types, sampling and nodes/materials to store, the KPI summary is computed for all events
+# e.g. LogPolicy(types=[]) stores nothing, LogPolicy(sampling={LogType.INVENTORY: 10}) stores every 10th inventory change
+LOG_POLICY = LogPolicy()
+# Database storing the KPIs of the run in the SimulationRun and SimulationResult tables (None: not stored)
+RESULT_DATABASE = None
 
 
 def main():
     """ Initializing and starting the simulation """
     # starttime = datetime.datetime(2024, 3, 23)
     starttime = datetime.datetime.today()
-    Log.starttime = starttime
-    env = simpy.Environment()
-    data = datastruct.DataStructure(DATABASE, starttime, env)
-    # Starting the customers
-    for node in data.network_nodes.values():
-        if isinstance(node, datastruct.Customer):
-            node.start(data)
-    try:
-        env.run(until=HORIZON)
-    finally:
-        # Log.print_logs()
-        # Log.save_log('log.csv')
-        pass
+    run = SimulationRun(DATABASE, HORIZON, starttime, log_policy=LOG_POLICY, log_sink=LOG_SINK)
+    summary = run.run()
+    if RESULT_DATABASE is not None:
+        with ResultStore(RESULT_DATABASE) as store:
+            run.store_results(store)
+    # run.log.print_logs()
+    # run.log.save_log('log.csv')
 
     # Printing simulation log and KPIs
     print()
-    summary = Log.get_summary()
     s = 'Cost_center'.ljust(15) + 'Cost'.ljust(15) + 'Income'.ljust(15) + 'Profit'.ljust(15)
-    for p in Log.properties:
+    for p in run.log.properties:
         s += p.ljust(15)
     print(s)
     for costcenter in summary.keys():
         s = costcenter.replace(' ', '_').ljust(15) + str(round(summary[costcenter]['cost'], 2)).ljust(15) + str(round(summary[costcenter]['income'], 2)).ljust(15)
         s += str(round(summary[costcenter]['income'] - summary[costcenter]['cost'], 2)).ljust(15)
-        for p in Log.properties:
+        for p in run.log.properties:
             s += str(round(summary[costcenter][p], 2)).ljust(15)
         print(s)
 
     # Print inventories
-    # for node in data.network_nodes.values():
+    # for node in run.data.network_nodes.values():
     #     for mat in node.inventory.keys():
-    #         if node.inventory[mat]['quantity'] > 0:
-    #             print(node.name, mat, node.inventory[mat]['quantity'])
+    #         if node.get_inventory(mat) > 0:
+    #             print(node.name, mat, node.get_inventory(mat))
 
     # Showing simulation results on the dashboard
-    presentation.show_dashboard(data.network_nodes, summary)
+    presentation.show_dashboard(run.data.network_nodes, summary, run.log)
 
 
 if __name__ == '__main__':
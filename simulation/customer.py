@@ -9,41 +9,44 @@ Date            Author          Comment
 29/11/2024      Egri            Initial version
 """
 import network_nodes
+from candidates import Candidate, get_candidates, select_cheapest
 
 
-def select_distribution_center(customer, demand, quantity, data):
-    """ Selecting distribution center to order from """
-    best_route = None
-    best_cost = None
+def get_distribution_centers(customer, material, data):
+    """ Distribution centers the customer can order the material from """
+    candidates = []
     for route in customer.route_ends:
-        node = data.network_nodes[route.source]
-        if isinstance(node, network_nodes.DistributionCenter) and node.is_valid(data.env.now):
-            # Check if enough inventory
-            if not demand.is_backlog and node.inventory[demand.material]['quantity'] < quantity:
-                continue
-            transport_mode = data.transport_modes[route.mode]
-            distance = data.get_distance(customer.name, route.source)
-            cost = quantity * node.inventory[demand.material]['price']
+        node = route.source_node
+        if isinstance(node, network_nodes.DistributionCenter) and material in node.inventory.keys():
+            cost = 0
             # Adding transportation cost if paid by the customer
             if route.costcenter == customer.name:
-                cost += transport_mode.fixedcost + transport_mode.distancecost * distance
-            if best_route is None or cost < best_cost:
-                best_route = route
-                best_cost = cost
-    return best_route
+                cost = route.transport_cost
+            candidates.append(Candidate(route, node, node.get_price(material), cost))
+    return candidates
+
+
+def select_distribution_center(customer, demand, quantity, data):
+    """ Selecting distribution center to order from """
+    candidates = get_candidates(data, ('distribution center', customer.name, demand.material),
+                                lambda: get_distribution_centers(customer, demand.material, data))
+    # Check if enough inventory
+    if demand.is_backlog:
+        return select_cheapest(candidates, quantity)
+    return select_cheapest(candidates, quantity, lambda node: node.get_inventory(demand.material) >= quantity)
+
+
+def get_collection_centers(customer, data):
+    """ Collection centers the customer can return used products to """
+    candidates = []
+    for route in customer.route_starts:
+        node = route.destination_node
+        if isinstance(node, network_nodes.CollectionCenter):
+            candidates.append(Candidate(route, node, 0, route.transport_cost))
+    return candidates
 
 
 def select_collection_center(customer, data):
     """ Selecting collection center for return used products """
-    best_route = None
-    best_cost = None
-    for route in customer.route_starts:
-        node = data.network_nodes[route.destination]
-        if isinstance(node, network_nodes.CollectionCenter) and node.is_valid(data.env.now):
-            transport_mode = data.transport_modes[route.mode]
-            distance = data.get_distance(customer.name, route.destination)
-            cost = transport_mode.fixedcost + transport_mode.distancecost * distance
-            if best_route is None or cost < best_cost:
-                best_route = route
-                best_cost = cost
-    return best_route
+    candidates = get_candidates(data, ('collection center', customer.name), lambda: get_collection_centers(customer, data))
+    return select_cheapest(candidates, 0)
@@ -0,0 +1,183 @@
+"""
+Copyright   :   Copyright 2024, HUN-REN SZTAKI
+File name   :   daily_demand.py
+Description :   Time-stepped vectorized demand generation of the COPROLOOPS simulation
+
+Revision history:
+Date            Author          Comment
+----------------------------------------------------------
+18/10/2026      SZTAKI          Initial version
+"""
+
+from math import inf
+import numpy as np
+import customer
+import distribution
+import network_nodes
+from candidates import get_candidates
+from log import LogType
+from network_nodes import Order
+
+
+def get_demands(data):
+    """ Customers and demands generated in daily batches, demands with invalid distributions are skipped """
+    customers = []
+    demands = []
+    for node in data.network_nodes.values():
+        if isinstance(node, network_nodes.Customer):
+            for demand in node.demand.values():
+                if isinstance(demand.quantity_distribution.sampler, distribution.InvalidSampler):
+                    print('Error with distribution')
+                    continue
+                customers.append(node)
+                demands.append(demand)
+    return customers, demands
+
+
+def get_demand_arrays(demands):
+    """ Parameters of the demands and their quantity distributions as arrays """
+    samplers = [demand.quantity_distribution.sampler for demand in demands]
+    return {
+        'demand_normal': np.array([isinstance(sampler, distribution.NormalSampler) for sampler in samplers], dtype=bool),
+        # Minimum and maximum of the uniform, average and deviation of the normal distributions
+        'demand_a': np.array([sampler.avg if isinstance(sampler, distribution.NormalSampler) else sampler.low for sampler in samplers], dtype=float),
+        'demand_b': np.array([sampler.std if isinstance(sampler, distribution.NormalSampler) else sampler.high for sampler in samplers], dtype=float),
+        'demand_multiplicative_trends': np.array([demand.multiplicative_trend for demand in demands], dtype=float),
+        'demand_additional_trends': np.array([demand.additional_trend for demand in demands], dtype=float),
+        'demand_waste_productions': np.array([demand.waste_production for demand in demands], dtype=float),
+        'demand_frequencies': np.array([demand.frequency for demand in demands], dtype=float),
+        'demand_backlogs': np.array([bool(demand.is_backlog) for demand in demands], dtype=bool),
+    }
+
+
+class DailyDemand:
+    """ Daily generation of the orders and returns of all customers
+        Once a day the quantities of all due demands are generated in one NumPy batch and routed to the
+        distribution centers with array operations. The distribution centers handle the orders one by one like in the
+        event-driven mode, so the open orders and the (s,S) decisions follow the same rules.
+        Transports, productions and disturbances remain event-driven.
+        The batches use their own random number stream, so the results differ from the event-driven demands
+        with the same seed. The routes are selected by the inventories at the beginning of the day.
+    """
+    def __init__(self, data):
+        self.customers, self.demands = get_demands(data)
+        # The parameters are read-only, they can be shared by the processes of the replications
+        arrays = data.shared.arrays if data.shared is not None else get_demand_arrays(self.demands)
+        self.normal = arrays['demand_normal']
+        self.a = arrays['demand_a']
+        self.b = arrays['demand_b']
+        self.multiplicative_trends = arrays['demand_multiplicative_trends']
+        self.additional_trends = arrays['demand_additional_trends']
+        self.waste_productions = arrays['demand_waste_productions']
+        self.frequencies = arrays['demand_frequencies']
+        self.backlogs = arrays['demand_backlogs']
+        self.next_times = np.zeros(len(self.demands))
+        self.rng = data.streams.get_stream('daily demand')
+        self.version = None
+
+    def compile_routes(self, data):
+        """ Candidate distribution centers of the demands as padded arrays in the route order
+            The arrays are rebuilt when the cached candidates are dropped (a node opens or closes).
+        """
+        self.version = data.network_version
+        self.valid = np.array([c.valid for c in self.customers], dtype=bool)
+        self.slots = []
+        slot_ids = dict()
+        rows = []
+        for c, demand in zip(self.customers, self.demands):
+            candidates = get_candidates(data, ('distribution center', c.name, demand.material),
+                                        lambda: customer.get_distribution_centers(c, demand.material, data))
+            row = sorted(candidates.candidates, key=lambda candidate: candidate.index)
+            for candidate in row:
+                key = (candidate.node, demand.material)
+                if key not in slot_ids:
+                    slot_ids[key] = len(self.slots)
+                    self.slots.append(key)
+            rows.append(row)
+        width = max((len(row) for row in rows), default=0)
+        # Slot (distribution center and material) of the candidates, -1 for padding
+        self.candidate_slots = np.full((len(rows), width), -1, dtype=np.int64)
+        self.prices = np.zeros((len(rows), width))
+        self.costs = np.full((len(rows), width), inf)
+        self.routes = [[candidate.route for candidate in row] for row in rows]
+        for i, (row, demand) in enumerate(zip(rows, self.demands)):
+            for j, candidate in enumerate(row):
+                self.candidate_slots[i, j] = slot_ids[(candidate.node, demand.material)]
+                self.prices[i, j] = candidate.price
+                self.costs[i, j] = candidate.cost
+        self.return_routes = [customer.select_collection_center(c, data) for c in self.customers]
+
+    def start(self, data):
+        """ Generating the first demands """
+        if len(self.demands) > 0:
+            data.env.schedule(0, self.step, data)
+
+    def step(self, data):
+        """ Generating the due demands of the day and scheduling the next day with due demands """
+        now = data.env.now
+        # Print times for debugging
+        if network_nodes.PRINT_EVENT_TIMES:
+            if now != data.lastday:
+                if now % 50 == 0:
+                    print()
+                print(now, end=' ')
+                data.lastday = now
+        if self.version != data.network_version:
+            self.compile_routes(data)
+        due = np.flatnonzero(self.next_times <= now)
+        self.next_times[due] = now + self.frequencies[due]
+        due = due[self.valid[due]]
+        if len(due) > 0:
+            self.order(due, data)
+            self.return_products(due, data)
+        data.env.schedule(self.next_times.min() - now, self.step, data)
+
+    def generate(self, due, multiplier, now):
+        """ Quantities of the due demands with trend """
+        normal = self.normal[due]
+        samples = np.empty(len(due))
+        count = int(np.count_nonzero(normal))
+        uniform = due[~normal]
+        samples[~normal] = self.a[uniform] + (self.b[uniform] - self.a[uniform]) * self.rng.random_array(len(due) - count)
+        samples[normal] = self.a[due[normal]] + self.b[due[normal]] * self.rng.standard_normal_array(count)
+        return distribution.apply_trends(samples, self.multiplicative_trends[due], self.additional_trends[due], multiplier, now)
+
+    def order(self, due, data):
+        """ Ordering from the cheapest distribution center with enough inventory (or any for backlog demands) """
+        quantities = self.generate(due, 1, data.env.now)
+        ordering = quantities > 0
+        due = due[ordering]
+        quantities = quantities[ordering]
+        slots = self.candidate_slots[due]
+        # Inventories at the beginning of the day, the padding slot -1 refers to the appended 0
+        inventories = np.array([node.get_inventory(material) for node, material in self.slots] + [0])
+        feasible = (slots >= 0) & (self.backlogs[due][:, None] | (inventories[slots] >= quantities[:, None]))
+        costs = np.where(feasible, quantities[:, None] * self.prices[due] + self.costs[due], inf)
+        # The first minimum breaks the ties by the route order
+        choices = np.argmin(costs, axis=1) if costs.shape[1] > 0 else np.zeros(len(due), dtype=np.int64)
+        found = feasible[np.arange(len(due)), choices] if costs.shape[1] > 0 else np.zeros(len(due), dtype=bool)
+        for i, qty, choice, is_found in zip(due.tolist(), quantities.tolist(), choices.tolist(), found.tolist()):
+            c = self.customers[i]
+            material = self.demands[i].material
+            if not is_found:
+                data.log.log(data, c.name, LogType.ORDER, qty, material, None, None, None, None, None, comment='Lost sale')
+            else:
+                route = self.routes[i][choice]
+                cost = route.source_node.get_price(material) * qty
+                data.log.log(data, c.name, LogType.ORDER, qty, material, route.source, route.mode, cost, c.costcenter, None, None)
+                route.source_node.order_management(Order(c, material, qty, route), data)
+
+    def return_products(self, due, data):
+        """ Returning used products to the cheapest collection center """
+        quantities = self.generate(due, self.waste_productions[due], data.env.now)
+        returning = quantities > 0
+        for i, qty in zip(due[returning].tolist(), quantities[returning].tolist()):
+            c = self.customers[i]
+            material = self.demands[i].material
+            route = self.return_routes[i]
+            if route is None:
+                data.log.log(data, c.name, LogType.RETURN, qty, material, None, None, None, None, None, comment='Lost return')
+            else:
+                order = Order(route.destination_node, material, qty, route)
+                data.log.log(data, c.name, LogType.RETURN, qty, material, order.customer.name, None, None, None, None, None)
+                c.ship(order, data, True)
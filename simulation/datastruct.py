@@ -10,20 +10,53 @@ Date            Author          Comment
 02/09/2025      Egri            First public version
 """
 
-from math import radians, cos, sin, asin, sqrt
 import sqlite3
 import datetime
-import random
-from log import Log
+import numpy as np
 import distribution
+import model_cache
 from network_nodes import (NetworkNode, Customer, DistributionCenter, ProductionSite, CollectionCenter,
                            RecoveryPlant)
 
+# Largest number of nodes with a full distance matrix, only the route distances are precomputed for larger models
+DISTANCE_MATRIX_SIZE = 1000
+# Radius of the earth in kilometers
+EARTH_RADIUS = 6371
+# Compiled model stored in the model cache
+MODEL_ATTRIBUTES = ('cost_centers', 'distributions', 'disturbances', 'network_nodes', 'materials', 'transport_modes',
+                    'property_names', 'operation_properties', 'node_ids')
+# Tables the model is read from, the model cache depends only on their content
+MODEL_TABLES = ('CostCenter', 'Distribution', 'Disturbance', 'OperationProperty', 'OperationPropertyLink', 'TransportMode',
+                'NetworkNode', 'ProductionSite', 'DistributionCenter', 'Customer', 'CollectionCenter', 'RecoveryPlant',
+                'Validity', 'Inventory', 'Demand', 'Material', 'BOM', 'MaterialPropertyLink', 'Route', 'ProducedMaterial',
+                'DisassembledMaterial', 'InverseBOM')
+# Arrays of the model stored in a separate section of the cache, not read by the runs using shared arrays
+ARRAY_ATTRIBUTES = ('latitudes', 'longitudes', 'validity_nodes', 'validity_dates')
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    """ Great-circle distances between coordinates given in radians (scalars or NumPy arrays) """
+    dlon = lon2 - lon1
+    dlat = lat2 - lat1
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    return 2 * np.arcsin(np.sqrt(a)) * EARTH_RADIUS
+
+
 class DataStructure:
-    """ Class for reading and storing master data """
-    def __init__(self, database, starttime, env):
+    """ Class for reading and storing master data
+        The environment, the log and the random number streams belong to one simulation run
+        shared: SharedArrays of the model created by shared_model, the coordinates, the validity dates, the distance
+                matrix and the route table are used from the shared memory (None: own copies)
+                The shared arrays belong to the whole database, so a subnetwork does not use them.
+        subnetwork: Subnetwork selecting the nodes and materials to read (None: the whole database)
+    """
+    def __init__(self, database, starttime, env, log, streams, shared=None, subnetwork=None):
         self.starttime = starttime
+        self.shared = shared if subnetwork is None else None
+        self.subnetwork = subnetwork
         self.env = env
+        self.log = log
+        self.streams = streams
         self.cost_centers = dict()
         self.distributions = dict()
         self.disturbances = dict()
@@ -31,17 +64,68 @@ class DataStructure:
         self.materials = dict()
         self.transport_modes = dict()
         self.node_distances = dict()
+        # Integer IDs of the nodes indexing the coordinate arrays and the distance matrix
+        self.node_ids = dict()
+        self.latitudes = None
+        self.longitudes = None
+        self.distances = None
+        # Distances and static costs of the routes indexed by the route IDs
+        self.route_table = None
+        # Candidate routes of the selections, built at the first use
+        self.candidates = dict()
+        # Incremented when the cached candidates are dropped, so derived routing tables can be rebuilt
+        self.network_version = 0
+        # Loads waiting for consolidation per route
+        self.loads = dict()
+        # Names of the operation properties, the operation property classes and the validity records of the nodes
+        # as read from the database
+        self.property_names = []
+        self.operation_properties = dict()
+        self.validity_rows = []
+        # Validity records as node IDs and dates (NaT for a missing date)
+        self.validity_nodes = None
+        self.validity_dates = None
         self.read_all(database)
         # The last day printed for debugging purposes
         self.lastday = None
 
     def read_all(self, database):
+        """ Reading the model from its compiled cache or from the database
+            The cache holds the model before the start time and the random number streams are applied,
+            so it is shared by all runs of the database.
+        """
+        # The cache holds the whole model, the distances are computed or shared, they are not cached
+        key = model_cache.get_key(database, (MODEL_ATTRIBUTES, ARRAY_ATTRIBUTES), MODEL_TABLES) if self.subnetwork is None else None
+        sections = model_cache.load(database, key, 1 if self.shared is not None else 2) if key is not None else None
+        if sections is not None:
+            for name in MODEL_ATTRIBUTES:
+                setattr(self, name, sections[0][name])
+            if self.shared is None:
+                for name in ARRAY_ATTRIBUTES:
+                    setattr(self, name, sections[1][name])
+            self.resolve_routes()
+        else:
+            self.read_database(database)
+            self.resolve_routes()
+            self.compile_nodes()
+            if key is not None:
+                model_cache.save(database, key, {name: getattr(self, name) for name in MODEL_ATTRIBUTES},
+                                 {name: getattr(self, name) for name in ARRAY_ATTRIBUTES})
+        self.compile_network()
+        self.log.set_properties(self.property_names)
+        self.set_validity()
+        self.attach_streams()
+
+    def read_database(self, database):
         conn = sqlite3.connect(database)
+        if self.subnetwork is not None:
+            self.subnetwork.select(conn)
         cursor = conn.cursor()
         self.read_cost_centers(cursor)
         self.read_distributions(cursor)
         self.read_disturbances(cursor)
-        operation_properties = self.read_operation_property_classes(cursor)
+        self.operation_properties = self.read_operation_property_classes(cursor)
+        operation_properties = self.operation_properties
         self.read_transport_modes(cursor, operation_properties)
         self.read_network_nodes(cursor, operation_properties)
         self.read_inventories(cursor)
@@ -53,26 +137,25 @@ class DataStructure:
         conn.close()
 
     def read_cost_centers(self, cursor):
-        cursor.execute('SELECT * FROM CostCenter')
-        for name in cursor.fetchall():
+        cursor.execute('SELECT Name FROM CostCenter')
+        for name, in cursor.fetchall():
             self.cost_centers[name] = CostCenter(name)
 
     def read_distributions(self, cursor):
-        cursor.execute('SELECT * FROM Distribution')
+        cursor.execute('SELECT ID, Type, Min, Max, Avg, Std FROM Distribution')
         for id, type, min, max, avg, std in cursor.fetchall():
             self.distributions[id] = Distribution(type, min, max, avg, std)
 
     def read_disturbances(self, cursor):
-        cursor.execute('SELECT * FROM Disturbance')
+        cursor.execute('SELECT ID, Probability, Duration, Loss FROM Disturbance')
         for id, pobability, duration, loss in cursor.fetchall():
             self.disturbances[id] = Disturbance(pobability, self.distributions[duration], loss)
 
     def read_operation_property_classes(self, cursor):
-        cursor.execute('SELECT * FROM OperationProperty')
-        for property, in cursor.fetchall():
-            Log.properties.append(property)
+        cursor.execute('SELECT Name FROM OperationProperty')
+        self.property_names = [property for property, in cursor.fetchall()]
         properties = dict()
-        cursor.execute('SELECT * FROM OperationPropertyLink')
+        cursor.execute('SELECT ClassID, OperationProperty, Value FROM OperationPropertyLink')
         for id, property, value in cursor.fetchall():
             property_list = None
             if id in properties.keys():
@@ -89,109 +172,227 @@ class DataStructure:
     #     return properties[id]
 
     def read_transport_modes(self, cursor, properties):
-        cursor.execute('SELECT * FROM TransportMode')
+        cursor.execute('SELECT Name, FixedCost, DistanceCost, Time, DisturbanceID, OperationPropertyID FROM TransportMode')
         for name, fixedcost, distancecost, time, disturbanceid, property_id in cursor.fetchall():
             disturbance = None
             if disturbanceid is not None:
                 disturbance = self.disturbances[disturbanceid]
-            self.transport_modes[name] = TransportMode(name, fixedcost, distancecost, time, disturbance, properties[property_id])
+            self.transport_modes[name] = TransportMode(name, fixedcost, distancecost, time, disturbance, properties[property_id], None)
 
     def read_network_nodes(self, cursor, properties):
-        cursor.execute('SELECT * FROM NetworkNode')
+        cursor.execute('SELECT Name, Latitude, Longitude, CostCenter, DisturbanceID FROM NetworkNode')
         for name, latitude, longitude, costcenter, disturbanceid in cursor.fetchall():
             disturbance = None
             if disturbanceid is not None:
                 disturbance = self.disturbances[disturbanceid]
-            self.network_nodes[name] = NetworkNode(name, latitude, longitude, costcenter, disturbance)
-        cursor.execute('SELECT * FROM ProductionSite')
+            self.network_nodes[name] = NetworkNode(name, latitude, longitude, costcenter, disturbance, None)
+        cursor.execute('SELECT NetworkNode, CapacityLimit FROM ProductionSite')
         for name, capacity in cursor.fetchall():
             self.network_nodes[name] = ProductionSite(self.network_nodes[name], capacity)
-        cursor.execute('SELECT * FROM DistributionCenter')
+        cursor.execute('SELECT NetworkNode, CapacityLimit, OperationPropertyID FROM DistributionCenter')
         for name, capacity, property_id in cursor.fetchall():
             property = None
             if property_id is not None:
                 property = properties[property_id]
             self.network_nodes[name] = DistributionCenter(self.network_nodes[name], capacity, property)
-        cursor.execute('SELECT * FROM Customer')
+        cursor.execute('SELECT NetworkNode FROM Customer')
         for name, in cursor.fetchall():
             self.network_nodes[name] = Customer(self.network_nodes[name])
-        cursor.execute('SELECT * FROM CollectionCenter')
+        cursor.execute('SELECT NetworkNode, CapacityLimit, OperationPropertyID FROM CollectionCenter')
         for name, capacity, property_id in cursor.fetchall():
             property = None
             if property_id is not None:
                 property = properties[property_id]
             self.network_nodes[name] = CollectionCenter(self.network_nodes[name], capacity, property)
-        cursor.execute('SELECT * FROM RecoveryPlant')
+        cursor.execute('SELECT NetworkNode, CapacityLimit FROM RecoveryPlant')
         for name, capacity in cursor.fetchall():
             self.network_nodes[name] = RecoveryPlant(self.network_nodes[name], capacity)
-        cursor.execute('SELECT * FROM Validity')
-        for name, start, end in cursor.fetchall():
-            if None != start:
-                start = (datetime.datetime.fromisoformat(start)-self.starttime).days
-            if None != end:
-                end = (datetime.datetime.fromisoformat(end)-self.starttime).days
-            self.network_nodes[name].validity.append({'start': start, 'end': end})
+        # The dates are converted by compile_nodes and set_validity, the days depend on the start time of the run
+        cursor.execute('SELECT NetworkNode, Start, End FROM Validity')
+        self.validity_rows = cursor.fetchall()
+
+    def set_validity(self):
+        """ Validity intervals of the nodes in days from the start time """
+        starttime = np.datetime64(self.starttime, 'us')
+        missing = np.isnat(self.validity_dates)
+        # Floor division like timedelta.days in get_day
+        days = (np.where(missing, starttime, self.validity_dates) - starttime) // np.timedelta64(1, 'D')
+        nodes = list(self.network_nodes.values())
+        for i, (start, end), (nostart, noend) in zip(self.validity_nodes.tolist(), days.tolist(), missing.tolist()):
+            nodes[i].validity.append({'start': None if nostart else start, 'end': None if noend else end})
+        for node in self.network_nodes.values():
+            node.compile_validity()
+
+    def get_day(self, date):
+        """ Day of a date from the start time, None for a missing date """
+        if None == date:
+            return None
+        return (datetime.datetime.fromisoformat(date)-self.starttime).days
 
     def read_inventories(self, cursor):
-        cursor.execute('SELECT * FROM Inventory')
+        cursor.execute('SELECT Material, NetworkNode, Quantity, Price FROM Inventory')
         for material, node, quantity, price in cursor.fetchall():
             self.network_nodes[node].set_inventory(material, quantity, price)
 
     def read_demands(self, cursor):
-        cursor.execute('SELECT * FROM Demand')
+        cursor.execute('SELECT Customer, Material, Frequency, Quantity, IsBacklog, AdditionalTrend, MultiplicativeTrend, Duedate, WasteProduction FROM Demand')
         for customer, material, frequency, quantity_distribution, is_backlog, additional_trend, multiplicative_trend, duedate, waste_production in cursor.fetchall():
             self.network_nodes[customer].demand[material] = Demand(material, frequency, self.distributions[quantity_distribution], is_backlog,
-                                                      additional_trend, multiplicative_trend, duedate, waste_production)
+                                                      additional_trend, multiplicative_trend, duedate, waste_production, None)
 
     def read_materials(self, cursor):
-        cursor.execute('SELECT * FROM Material')
+        cursor.execute('SELECT Name, Volume, Mass FROM Material')
         for name, volume, mass in cursor.fetchall():
             self.materials[name] = Material(name, volume, mass)
-        cursor.execute('SELECT * FROM BOM')
+        cursor.execute('SELECT Product, Component, Quantity FROM BOM')
         for product, component, quantity in cursor.fetchall():
             self.materials[product].add_bom(component, quantity)
         # cursor.execute('SELECT link.MaterialName, prop.Name FROM MaterialPropertyLink link ' +
         #                'JOIN MaterialProperty prop ON link.MaterialPropertyName = prop.Name ')
-        cursor.execute('SELECT * FROM MaterialPropertyLink')
+        cursor.execute('SELECT MaterialName, MaterialPropertyName, Value FROM MaterialPropertyLink')
         for material, property, value in cursor.fetchall():
             self.materials[material].properties.append({'property': property, 'value': value})
+        self.compute_low_level_codes()
+
+    def compute_low_level_codes(self):
+        """ Computing the low-level codes of the materials in one pass over the BOM (Kahn's algorithm)
+            The low-level code planning of the production sites nets the materials in this order, a cyclic BOM is rejected.
+        """
+        parents = {name: 0 for name in self.materials.keys()}
+        for material in self.materials.values():
+            for component in material.bom.keys():
+                parents[component] += 1
+        stack = [name for name, count in parents.items() if count == 0]
+        processed = 0
+        while stack:
+            material = self.materials[stack.pop()]
+            processed += 1
+            for component in material.bom.keys():
+                self.materials[component].level = max(self.materials[component].level, material.level + 1)
+                parents[component] -= 1
+                if parents[component] == 0:
+                    stack.append(component)
+        if processed < len(self.materials):
+            raise Exception('Cyclic BOM')
 
     def read_routes(self, cursor):
-        cursor.execute('SELECT * FROM Route')
+        cursor.execute('SELECT Source, Destination, TransportMode, CostCenter FROM Route')
         for source, destination, mode, costcenter in cursor.fetchall():
             route = Route(source, destination, mode, costcenter)
             self.network_nodes[source].route_starts.append(route)
             self.network_nodes[destination].route_ends.append(route)
 
+    def resolve_routes(self):
+        """ Resolving the nodes and the transport modes of the routes (not stored in the cache) """
+        for node in self.network_nodes.values():
+            for route in node.route_starts:
+                route.source_node = node
+                route.destination_node = self.network_nodes[route.destination]
+                route.transport_mode = self.transport_modes[route.mode]
+
     def read_produced_materials(self, cursor, properties):
-        cursor.execute('SELECT * FROM ProducedMaterial')
+        cursor.execute('SELECT ProductionSite, MaterialName, Cost, Time, CapacityUsage, Price, OperationPropertyID FROM ProducedMaterial')
         for node, material, cost, time, capacity_usage, price, property_id in cursor.fetchall():
             self.network_nodes[node].produced_materials[material] = ProducedMaterial(cost, time, capacity_usage, price, properties[property_id])
 
     def read_disassembled_materials(self, cursor, properties):
-        cursor.execute('SELECT * FROM DisassembledMaterial')
+        cursor.execute('SELECT Product, RecoveryPlant, Cost, Time, CapacityUsage, OperationPropertyID FROM DisassembledMaterial')
         for product, node, cost, time, capacity_usage, property_id in cursor.fetchall():
             self.network_nodes[node].disassembled_materials[product] = DisassembledMaterial(cost, time, capacity_usage, properties[property_id])
-        cursor.execute('SELECT * FROM InverseBOM')
+        cursor.execute('SELECT Product, RecoveryPlant, Component, Quantity, Price FROM InverseBOM')
         for product, node, component, quantity, price in cursor.fetchall():
-            self.network_nodes[node].disassembled_materials[product].inverse_bom[component] = InverseBOM(self.distributions[quantity], price)
+            self.network_nodes[node].disassembled_materials[product].inverse_bom[component] = InverseBOM(self.distributions[quantity], price, None)
+
+    def attach_streams(self):
+        """ Random number streams of the entities, they depend on the seed of the run """
+        for name, transport_mode in self.transport_modes.items():
+            transport_mode.rng = self.streams.get_stream('transport', name)
+        for name, node in self.network_nodes.items():
+            node.rng = self.streams.get_stream('node', name)
+            if isinstance(node, Customer):
+                for material, demand in node.demand.items():
+                    demand.rng = self.streams.get_stream('demand', name, material)
+            elif isinstance(node, RecoveryPlant):
+                for product, disassembled_material in node.disassembled_materials.items():
+                    for component, inverse_bom in disassembled_material.inverse_bom.items():
+                        inverse_bom.rng = self.streams.get_stream('disassembly', name, product, component)
+
+    def schedule_validity(self):
+        """ Scheduling the opening and closing events of the network nodes """
+        for node in self.network_nodes.values():
+            node.schedule_validity(self)
+
+    def clear_candidates(self):
+        """ Dropping the cached candidate routes after opening or closing a node or changing the network """
+        self.candidates.clear()
+        self.network_version += 1
+
+    def compile_nodes(self):
+        """ Computing the node IDs, the coordinates and the validity dates of the nodes as arrays """
+        self.node_ids = {name: i for i, name in enumerate(self.network_nodes.keys())}
+        for name, i in self.node_ids.items():
+            self.network_nodes[name].id = i
+        nodes = self.network_nodes.values()
+        self.latitudes = np.radians(np.array([node.latitude for node in nodes], dtype=np.float64))
+        self.longitudes = np.radians(np.array([node.longitude for node in nodes], dtype=np.float64))
+        self.validity_nodes = np.array([self.node_ids[name] for name, start, end in self.validity_rows], dtype=np.int32)
+        self.validity_dates = np.array([[get_date(start), get_date(end)] for name, start, end in self.validity_rows],
+                                       dtype='datetime64[us]').reshape(-1, 2)
+        self.validity_rows = []
+
+    def compile_network(self):
+        """ Computing the distance matrix and the route table in NumPy passes, or attaching the shared ones """
+        self.node_distances = dict()
+        routes = [route for node in self.network_nodes.values() for route in node.route_starts]
+        if self.shared is not None:
+            self.attach_shared(routes)
+            return
+        if len(self.node_ids) <= DISTANCE_MATRIX_SIZE:
+            self.distances = haversine(self.latitudes[:, None], self.longitudes[:, None],
+                                       self.latitudes[None, :], self.longitudes[None, :])
+        else:
+            self.distances = None
+        self.route_table = self.compile_routes(routes)
+
+    def compile_routes(self, routes):
+        """ Route table of the routes with their distances and static transportation costs, the routes are numbered """
+        sources = np.array([self.node_ids[route.source] for route in routes], dtype=np.intp)
+        destinations = np.array([self.node_ids[route.destination] for route in routes], dtype=np.intp)
+        distances = haversine(self.latitudes[sources], self.longitudes[sources],
+                              self.latitudes[destinations], self.longitudes[destinations])
+        fixedcosts = np.array([route.transport_mode.fixedcost for route in routes], dtype=np.float64)
+        distancecosts = np.array([route.transport_mode.distancecost for route in routes], dtype=np.float64)
+        return self.number_routes(routes, RouteTable(distances, fixedcosts + distancecosts * distances))
+
+    def number_routes(self, routes, table):
+        """ Setting the IDs of the routes as their indices in the route table """
+        for i, route in enumerate(routes):
+            route.id = i
+            route.table = table
+        return table
+
+    def attach_shared(self, routes):
+        """ Using the coordinates, the validity dates, the distance matrix and the route table of the shared arrays
+            instead of own copies
+        """
+        arrays = self.shared.arrays
+        self.latitudes = arrays['latitudes']
+        self.longitudes = arrays['longitudes']
+        self.validity_nodes = arrays['validity_nodes']
+        self.validity_dates = arrays['validity_dates']
+        self.distances = arrays.get('distances')
+        self.route_table = self.number_routes(routes, RouteTable(arrays['route_distances'], arrays['route_costs']))
 
     def calculate_distance(self, node1, node2):
         """ Computes distance between two nodes """
-        lon1 = radians(self.network_nodes[node1].longitude)
-        lon2 = radians(self.network_nodes[node2].longitude)
-        lat1 = radians(self.network_nodes[node1].latitude)
-        lat2 = radians(self.network_nodes[node2].latitude)
-        # Haversine formula
-        dlon = lon2 - lon1
-        dlat = lat2 - lat1
-        a = sin(dlat / 2) ** 2 + cos(lat1) * cos(lat2) * sin(dlon / 2) ** 2
-        c = 2 * asin(sqrt(a))
-        # 6371 is the radius of earth in kilometers
-        return c * 6371
+        i = self.node_ids[node1]
+        j = self.node_ids[node2]
+        return float(haversine(self.latitudes[i], self.longitudes[i], self.latitudes[j], self.longitudes[j]))
 
     def get_distance(self, node1, node2):
-        """ Returns distance between two nodes -- computes distances maximum one time """
+        """ Returns distance between two nodes -- from the distance matrix or computed maximum one time """
+        if self.distances is not None:
+            return float(self.distances[self.node_ids[node1], self.node_ids[node2]])
         distances = None
         if node1 in self.node_distances:
             distances = self.node_distances[node1]
@@ -204,21 +405,36 @@ class DataStructure:
         distances[node2] = d
         return d
 
+
+def get_date(date):
+    """ Date of the database as a NumPy datetime, NaT for a missing date """
+    if None == date:
+        return np.datetime64('NaT', 'us')
+    return np.datetime64(datetime.datetime.fromisoformat(date), 'us')
+
+
 class CostCenter:
+    __slots__ = ('name',)
+
     def __init__(self, name):
         self.name = name
 
 
 class Distribution:
+    __slots__ = ('type', 'min', 'max', 'avg', 'std', 'sampler')
+
     def __init__(self, type, min, max, avg, std):
         self.type = type
         self.min = min
         self.max = max
         self.avg = avg
         self.std = std
+        self.sampler = distribution.compile_distribution(self)
 
 
 class Disturbance:
+    __slots__ = ('probability', 'duration', 'loss')
+
     def __init__(self, probability, duration, loss):
         self.probability = probability
         self.duration = duration
@@ -226,7 +442,9 @@ class Disturbance:
 
 
 class Demand:
-    def __init__(self, material, frequency, quantity_distribution, is_backlog, additional_trend, multiplicative_trend, duedate, waste_production):
+    __slots__ = ('material', 'frequency', 'quantity_distribution', 'is_backlog', 'additional_trend', 'multiplicative_trend', 'duedate', 'waste_production', 'rng')
+
+    def __init__(self, material, frequency, quantity_distribution, is_backlog, additional_trend, multiplicative_trend, duedate, waste_production, rng):
         self.material = material
         self.frequency = frequency
         self.quantity_distribution = quantity_distribution
@@ -235,48 +453,106 @@ class Demand:
         self.multiplicative_trend = multiplicative_trend
         self.duedate = duedate
         self.waste_production = waste_production
+        # Random number stream of the order and return quantities
+        self.rng = rng
 
 
 class Material:
+    __slots__ = ('name', 'volume', 'mass', 'bom', 'properties', 'level')
+
     def __init__(self, name, volume, mass):
         self.name = name
         self.volume = volume
         self.mass = mass
         self.bom = dict()
         self.properties = []
+        # Low-level code: the deepest BOM level where the material occurs
+        self.level = 0
 
     def add_bom(self, component, quantity):
         self.bom[component] = quantity
 
 
 class TransportMode:
-    def __init__(self, name, fixedcost, distancecost, time, disturbance, properties):
+    __slots__ = ('name', 'fixedcost', 'distancecost', 'time', 'disturbance', 'properties', 'rng')
+
+    def __init__(self, name, fixedcost, distancecost, time, disturbance, properties, rng):
         self.name = name
         self.fixedcost = fixedcost
         self.distancecost = distancecost
         self.time = time
         self.disturbance = disturbance
         self.properties = properties
+        # Random number stream of the disturbances
+        self.rng = rng
 
     def get_disturbance(self, isloss):
         duration = 0
         loss = 0
-        if self.disturbance is not None and random.random() < self.disturbance.probability:
-            duration = distribution.random_from_distribution(self.disturbance.duration)
+        if self.disturbance is not None and self.rng.bernoulli(self.disturbance.probability):
+            duration = distribution.random_from_distribution(self.disturbance.duration, self.rng)
             if isloss:
                 loss = self.disturbance.loss
         return duration, loss
 
 
+class RouteTable:
+    """ Distances and static transportation costs of the routes indexed by the route IDs
+        The arrays are computed by DataStructure.compile_routes or used from the shared memory.
+    """
+    __slots__ = ('distances', 'costs')
+
+    def __init__(self, distances, costs):
+        self.distances = distances
+        self.costs = costs
+
+
 class Route:
+    __slots__ = ('source', 'destination', 'mode', 'costcenter', 'source_node', 'destination_node', 'transport_mode', 'id', 'table')
+
     def __init__(self, source, destination, mode, costcenter):
         self.source = source
         self.destination = destination
         self.mode = mode
         self.costcenter = costcenter
+        # Resolved references, set by DataStructure.resolve_routes
+        self.source_node = None
+        self.destination_node = None
+        self.transport_mode = None
+        # Index and route table of the static transportation data, set when the model is compiled
+        self.id = None
+        self.table = None
+
+    def __getstate__(self):
+        """ The resolved references and the route table are not pickled, DataStructure sets them after loading """
+        return self.source, self.destination, self.mode, self.costcenter
+
+    def __setstate__(self, state):
+        self.source, self.destination, self.mode, self.costcenter = state
+        self.source_node = None
+        self.destination_node = None
+        self.transport_mode = None
+        self.id = None
+        self.table = None
+
+    @property
+    def distance(self):
+        return self.table.distances[self.id]
+
+    @property
+    def transport_cost(self):
+        return self.table.costs[self.id]
+
+    @property
+    def transport_properties(self):
+        """ Operation properties of a transportation on the route """
+        distance = self.table.distances[self.id]
+        return {property['property']: property['value'] * distance for property in self.transport_mode.properties}
 
 
 class ProducedMaterial:
+    __slots__ = ('cost', 'time', 'capacity_usage', 'price', 'properties')
+
     def __init__(self, cost, time, capacity_usage, price, properties):
         self.cost = cost
         self.time = time
@@ -286,12 +562,18 @@ class ProducedMaterial:
 
 
 class InverseBOM:
-    def __init__(self, quantity_distribution, price):
+    __slots__ = ('quantity_distribution', 'price', 'rng')
+
+    def __init__(self, quantity_distribution, price, rng):
         self.quantity_distribution = quantity_distribution
         self.price = price
+        # Random number stream of the component yield
+        self.rng = rng
 
 
 class DisassembledMaterial:
+    __slots__ = ('cost', 'time', 'capacity_usage', 'inverse_bom', 'properties')
+
     def __init__(self, cost, time, capacity_usage, properties):
         self.cost = cost
         self.time = time
@@ -8,7 +8,7 @@ Date            Author          Comment
 ----------------------------------------------------------
 29/11/2024      Egri            Initial version
 """
-from numpy import random
+import numpy as np
 
 # Trends increase monthly
 TREND_PERIODICITY = 30
@@ -18,24 +18,50 @@ class InvalidDistributionError(Exception):
 	pass
 
 
-def random_from_distribution(distribution):
-	""" Generating value from a statistical distribution """
-	if 'uniform' == distribution.type:
-		if distribution.min is None or distribution.max is None:
-			raise InvalidDistributionError()
-		return random.uniform(distribution.min, distribution.max)
-	if 'normal' == distribution.type:
-		if distribution.avg is None or distribution.std is None:
-			raise InvalidDistributionError()
-		return random.normal(distribution.avg, distribution.std)
-	raise InvalidDistributionError()
+class UniformSampler:
+	def __init__(self, low, high):
+		self.low = low
+		self.high = high
 
+	def sample(self, rng):
+		return rng.uniform(self.low, self.high)
 
-def generate_order_quantity(demand, multiplier, now):
+
+class NormalSampler:
+	def __init__(self, avg, std):
+		self.avg = avg
+		self.std = std
+
+	def sample(self, rng):
+		return rng.normal(self.avg, self.std)
+
+
+class InvalidSampler:
+	def sample(self, rng):
+		raise InvalidDistributionError()
+
+
+def compile_distribution(distribution):
+	""" Sampler of a statistical distribution, the type and the parameters are checked only once at load time """
+	if 'uniform' == distribution.type and distribution.min is not None and distribution.max is not None:
+		return UniformSampler(distribution.min, distribution.max)
+	if 'normal' == distribution.type and distribution.avg is not None and distribution.std is not None:
+		return NormalSampler(distribution.avg, distribution.std)
+	return InvalidSampler()
+
+
+def random_from_distribution(distribution, rng):
+	""" Generating value from a statistical distribution with the random number stream of an entity
+		The variates are drawn in blocks by the stream
+	"""
+	return distribution.sampler.sample(rng)
+
+
+def generate_order_quantity(demand, multiplier, now, rng):
 	""" Generating demand considering trend """
 	qty = None
 	try:
-		qty = random_from_distribution(demand.quantity_distribution)
+		qty = random_from_distribution(demand.quantity_distribution, rng)
 	except InvalidDistributionError:
 		print('Error with distribution')
 	if qty is not None:
@@ -46,11 +72,18 @@ def generate_order_quantity(demand, multiplier, now):
 	return 0
 
 
-def generate_disassembly_quantity(distribution, multiplier):
+def apply_trends(qty, multiplicative_trend, additional_trend, multiplier, now):
+	""" Order quantities with trend for quantities generated in one batch (NumPy arrays) """
+	period = now / TREND_PERIODICITY
+	qty = (qty * np.power(multiplicative_trend, period) + additional_trend * period) * multiplier
+	return np.rint(qty).astype(np.int64)
+
+
+def generate_disassembly_quantity(distribution, multiplier, rng):
 	""" Generating component quantity from the disassembled product quantity """
 	qty = None
 	try:
-		qty = random_from_distribution(distribution)
+		qty = random_from_distribution(distribution, rng)
 	except InvalidDistributionError:
 		print('Error with distribution')
 	if qty is not None:
@@ -9,6 +9,7 @@ Date            Author          Comment
 29/11/2024      Egri            Initial version
 """
 import network_nodes
+from candidates import Candidate, get_candidates, select_cheapest
 
 # Multipliers for the (s, S) inventory policy (related to the average demand)
 s_MULTIPLIER = 2
@@ -29,40 +30,26 @@ def getsS(dc, history):
     """ Sample (s,S) levels for the distribution center
         Average demand multiplied by constants, independently of the distribution center
     """
-    sum = 0
-    first = None
-    last = None
-    for demand in history:
-        time = demand['time']
-        quantity = demand['quantity']
-        sum += quantity
-        if first is None or time < first:
-            first = time
-        if last is None or time > last:
-            last = time
-    if first is None or last is None:
-        return 0, 0
-    return round(s_MULTIPLIER * sum / (last - first + 1)), round(S_MULTIPLIER * sum / (last - first + 1))
+    average = history.get_average()
+    return round(s_MULTIPLIER * average), round(S_MULTIPLIER * average)
 
 
-def select_plant(dc, material, quantity, data):
-    """ Selecting plant to order from """
-    best_route = None
-    best_cost = None
+def get_plants(dc, material, data):
+    """ Production sites producing the material for the distribution center """
+    candidates = []
     for route in dc.route_ends:
-        node = data.network_nodes[route.source]
-        if isinstance(node, network_nodes.ProductionSite) and node.is_valid(data.env.now):
-            # Check if plant produces material
-            if material not in node.produced_materials.keys():
-                continue
-            transport_mode = data.transport_modes[route.mode]
-            distance = data.get_distance(dc.name, route.source)
-            cost = quantity * node.inventory[material]['price']
+        node = route.source_node
+        # Check if plant produces material
+        if isinstance(node, network_nodes.ProductionSite) and material in node.produced_materials.keys():
+            cost = 0
             # Adding transportation cost if paid by the distribution center
             if route.costcenter == dc.name:
-                cost += transport_mode.fixedcost + transport_mode.distancecost * distance
-            if best_route is None or cost < best_cost:
-                best_route = route
-                best_cost = cost
-    return best_route
+                cost = route.transport_cost
+            candidates.append(Candidate(route, node, node.get_price(material), cost))
+    return candidates
+
 
+def select_plant(dc, material, quantity, data):
+    """ Selecting plant to order from """
+    candidates = get_candidates(data, ('plant', dc.name, material), lambda: get_plants(dc, material, data))
+    return select_cheapest(candidates, quantity)
@@ -0,0 +1,66 @@
+"""
+Copyright   :   Copyright 2024, HUN-REN SZTAKI
+File name   :   engine.py
+Description :   Discrete-event simulation engines of the COPROLOOPS simulation
+
+Revision history:
+Date            Author          Comment
+----------------------------------------------------------
+18/10/2026      SZTAKI          Initial version
+"""
+
+import heapq
+import simpy
+
+
+# The engines have the same interface, the model uses only these members:
+# now: the current simulation time
+# schedule(delay, callback, *args): calling callback(*args) at now + delay, the callbacks of the same time are called
+#                                   in the order of their scheduling
+# run(until): calling the callbacks scheduled before the given time
+
+
+class SimPyEngine:
+    """ Engine on a SimPy environment, each callback is a timeout event """
+    def __init__(self):
+        self.env = simpy.Environment()
+
+    @property
+    def now(self):
+        return self.env.now
+
+    def schedule(self, delay, callback, *args):
+        self.env.timeout(delay).callbacks.append(lambda event: callback(*args))
+
+    def run(self, until):
+        self.env.run(until=until)
+
+
+class HeapEngine:
+    """ Lean engine calling the callbacks from a heap of (time, sequence number, callback, arguments) tuples """
+    def __init__(self):
+        self.now = 0
+        self.heap = []
+        self.counter = 0
+
+    def schedule(self, delay, callback, *args):
+        heapq.heappush(self.heap, (self.now + delay, self.counter, callback, args))
+        self.counter += 1
+
+    def run(self, until):
+        heap = self.heap
+        while heap and heap[0][0] < until:
+            time, counter, callback, args = heapq.heappop(heap)
+            self.now = time
+            callback(*args)
+        self.now = until
+
+
+# Engines by name
+ENGINES = {'simpy': SimPyEngine, 'heap': HeapEngine}
+
+
+def create_engine(name):
+    if name not in ENGINES:
+        raise Exception('Unknown simulation engine: %s' % name)
+    return ENGINES[name]()
@@ -12,6 +12,22 @@ Date            Author          Comment
 
 import datetime
 from enum import Enum
+import queue
+import threading
+import numpy as np
+import log_sink
+
+# Number of log entries preallocated, the columns are doubled when full
+INITIAL_CAPACITY = 4096
+# Size of the fixed log buffer if the log is streamed into a sink
+SINK_BUFFER_SIZE = 65536
+# Maximum number of full buffers waiting for the writer thread
+SINK_QUEUE_SIZE = 4
+# Names of the log columns
+COLUMNS = ['times', 'types', 'nodes', 'quantities', 'materials', 'node2s', 'modes', 'costs', 'costcenters',
+           'comments', 'levels', 'property_values']
+# Comment of the inventory entries, the new level is stored in a numeric column and formatted only when decoding
+LEVEL_COMMENT = 'New level: %s'
 
 
 class LogType(Enum):
@@ -29,40 +45,323 @@ class LogType(Enum):
     DISTURBANCE = 11
 
 
+# Log type names indexed by the numeric value of the log type
+LOG_TYPE_NAMES = np.array([None] + [t.name for t in LogType], dtype=object)
+
+
+class CodeTable:
+    """ Interning strings into integer codes, -1 stands for None """
+    def __init__(self):
+        self.codes = dict()
+        self.values = []
+
+    def code(self, value):
+        if value is None:
+            return -1
+        code = self.codes.get(value)
+        if code is None:
+            code = len(self.values)
+            self.codes[value] = code
+            self.values.append(value)
+        return code
+
+    def lookup(self, codes):
+        """ Decoding an array of codes into an object array
+            The values are copied first, since the simulation may add new values meanwhile
+        """
+        return lookup_table(self.values[:])[codes]
+
+
+def lookup_table(values):
+    """ Object array of the values extended with None for code -1 """
+    table = np.empty(len(values) + 1, dtype=object)
+    table[:-1] = values
+    table[-1] = None
+    return table
+
+
+def format_number(value):
+    """ Printing integer quantities without decimals """
+    return str(int(value)) if value.is_integer() else str(value)
+
+
+class LogChunk:
+    """ Raw columns of consecutive log entries with everything needed for decoding them """
+    def __init__(self, columns, size, starttime, properties, node_table, node_types, material_table, mode_table,
+                 costcenter_table, comment_table):
+        self.size = size
+        for name in COLUMNS:
+            setattr(self, name, columns[name][:size])
+        self.starttime = starttime
+        self.properties = properties
+        self.node_table = node_table
+        self.node_types = node_types
+        self.material_table = material_table
+        self.mode_table = mode_table
+        self.costcenter_table = costcenter_table
+        self.comment_table = comment_table
+
+    def get_dates(self):
+        """ Converting simulation times into dates, each distinct time is converted only once """
+        times, inverse = np.unique(self.times, return_inverse=True)
+        dates = np.empty(len(times), dtype=object)
+        for i, time in enumerate(times):
+            dates[i] = (self.starttime + datetime.timedelta(float(time))).date()
+        return dates[inverse]
+
+    def get_comments(self):
+        """ Decoding the comments, the entries with an inventory level get the level comment """
+        comments = self.comment_table.lookup(self.comments)
+        levels = ~np.isnan(self.levels)
+        if levels.any():
+            comments[levels] = [LEVEL_COMMENT % format_number(level) for level in self.levels[levels]]
+        return comments
+
+    def decode(self):
+        """ Decoding the columns into object arrays """
+        return {'time': self.get_dates(),
+                'node': self.node_table.lookup(self.nodes),
+                'node_type': lookup_table(self.node_types[:])[self.nodes],
+                'event': LOG_TYPE_NAMES[self.types],
+                'quantity': self.quantities,
+                'material': self.material_table.lookup(self.materials),
+                'node2': self.node_table.lookup(self.node2s),
+                'mode': self.mode_table.lookup(self.modes),
+                'cost': self.costs,
+                'cost_center': self.costcenter_table.lookup(self.costcenters),
+                'comment': self.get_comments()}
+
+
+class LogPolicy:
+    """ Selecting the log entries to be stored, the KPI ledger is updated for all events
+        types: enabled log types, None enables all types
+        sampling: dictionary of log types and n, only every n-th entry of the type is stored
+        nodes, materials: allow-lists of node and material names, None allows all
+        The policy has no state, the sampling counters belong to the log, so a policy can be reused by several runs.
+    """
+    def __init__(self, types=None, sampling=None, nodes=None, materials=None):
+        enabled_types = set(types) if types is not None else set(LogType)
+        # Indexed by the value of the log type
+        self.enabled = [False] + [t in enabled_types for t in LogType]
+        self.sampling = [1] + [1 for t in LogType]
+        if sampling is not None:
+            for type, n in sampling.items():
+                self.sampling[type.value] = n
+        self.nodes = set(nodes) if nodes is not None else None
+        self.materials = set(materials) if materials is not None else None
+
+    def is_enabled(self, type, node, material):
+        """ Checking the type and the allow-lists without sampling """
+        return self.enabled[type.value] and (self.nodes is None or node in self.nodes) and \
+            (self.materials is None or material in self.materials)
+
+
+class LogWriter(threading.Thread):
+    """ Background thread writing the full log buffers into a sink """
+    def __init__(self, sink):
+        threading.Thread.__init__(self, name='LogWriter', daemon=True)
+        self.sink = sink
+        self.chunks = queue.Queue(maxsize=SINK_QUEUE_SIZE)
+        self.error = None
+
+    def run(self):
+        while True:
+            chunk = self.chunks.get()
+            if chunk is None:
+                break
+            if self.error is None:
+                try:
+                    self.sink.write(chunk)
+                except Exception as e:
+                    self.error = e
+
+    def close(self):
+        """ Writing the remaining buffers and closing the sink """
+        self.chunks.put(None)
+        self.join()
+        self.sink.close()
+        if self.error is not None:
+            raise self.error
+
+
 class Log:
-    """ Class for collecting simulation logs """
-    logs = []
-    properties = []
-    starttime = None
-
-    def __init__(self, time, node, node_type, type, quantity, material, node2, mode, cost, costcenter, properties, comment):
-        self.time = (self.starttime + datetime.timedelta(time)).date()
-        self.node = node
-        self.node_type = node_type
-        self.type = type
-        self.quantity = quantity
-        self.material = material
-        self.node2 = node2
-        self.mode = mode
-        self.cost = cost
-        self.costcenter = costcenter
-        if properties is not None:
-            self.properties = properties
-        else:
-            self.properties = dict()
-        self.comment = comment
-
-    @classmethod
-    def log(cls, data, node, type, quantity, material, node2, mode, cost, costcenter, properties, comment=None):
-        """ Adding a new log entry """
-        node_type = data.network_nodes[node].get_type()
-        log = Log(data.env.now, node, node_type, type, quantity, material, node2, mode, cost, costcenter, properties, comment)
-        cls.logs.append(log)
-
-    @classmethod
-    def print_logs(cls):
+    """ Class for collecting the logs of a simulation run
+        Each field is stored in a preallocated NumPy column, strings are stored as integer codes.
+        Comments are fixed texts, so the code tables do not grow with the horizon.
+        Without a sink the columns grow with the log, otherwise full buffers are passed to the sink.
+    """
+    def __init__(self, starttime, policy=None):
+        self.starttime = starttime
+        # Operation properties, set when the model is read
+        self.properties = []
+        self.property_index = dict()
+        # Selecting the stored entries, the KPI ledger is always updated
+        self.policy = policy if policy is not None else LogPolicy()
+        # Streaming the log
+        self.writer = None
+        self.clear()
+
+    def clear(self):
+        """ Removing all log entries """
+        self.size = 0
+        self.capacity = 0
+        for name in COLUMNS:
+            setattr(self, name, None)
+        # Code tables, node types are stored in the order of the node codes
+        self.node_table = CodeTable()
+        self.node_types = []
+        self.material_table = CodeTable()
+        self.mode_table = CodeTable()
+        self.costcenter_table = CodeTable()
+        self.comment_table = CodeTable()
+        # Sampling counters of the log types, counting only the enabled entries
+        self.counters = [0 for n in self.policy.sampling]
+        # Running [cost, income, properties...] totals indexed by the cost center code
+        self.ledger = None
+        # Cost center codes in the order of their first KPI
+        self.ledger_order = dict()
+
+    def set_properties(self, properties):
+        """ Setting the operation properties of the model (before the first entry) """
+        self.properties = list(properties)
+        self.property_index = {p: i for i, p in enumerate(self.properties)}
+
+    def allocate(self, capacity):
+        """ Allocating (or extending) the columns for the given number of entries """
+        def extend(column, dtype, fill, shape=()):
+            new = np.full((capacity,) + shape, fill, dtype=dtype)
+            if column is not None:
+                new[:self.size] = column[:self.size]
+            return new
+        self.times = extend(self.times, np.float64, 0)
+        self.types = extend(self.types, np.int8, 0)
+        self.nodes = extend(self.nodes, np.int32, -1)
+        self.quantities = extend(self.quantities, np.float64, 0)
+        self.materials = extend(self.materials, np.int32, -1)
+        self.node2s = extend(self.node2s, np.int32, -1)
+        self.modes = extend(self.modes, np.int32, -1)
+        self.costs = extend(self.costs, np.float64, np.nan)
+        self.costcenters = extend(self.costcenters, np.int32, -1)
+        self.comments = extend(self.comments, np.int32, -1)
+        self.levels = extend(self.levels, np.float64, np.nan)
+        self.property_values = extend(self.property_values, np.float64, np.nan, (len(self.properties),))
+        self.capacity = capacity
+
+    def open_sink(self, sink):
+        """ Streaming the log into the sink through a fixed size buffer """
+        sink.open(self.properties)
+        self.writer = LogWriter(sink)
+        self.writer.start()
+        if self.size > 0:
+            self.flush()
+        self.allocate(SINK_BUFFER_SIZE)
+
+    def close_sink(self):
+        """ Flushing the buffer and waiting for the writer thread """
+        if self.writer is not None:
+            self.flush()
+            writer = self.writer
+            self.writer = None
+            writer.close()
+
+    def get_chunk(self):
+        """ The entries in the buffer (without copying the columns) """
+        if self.capacity == 0:
+            self.allocate(0)
+        return LogChunk({name: getattr(self, name) for name in COLUMNS}, self.size, self.starttime, self.properties,
+                        self.node_table, self.node_types, self.material_table, self.mode_table, self.costcenter_table,
+                        self.comment_table)
+
+    def flush(self):
+        """ Passing the buffer to the writer thread and starting a new buffer """
+        self.writer.chunks.put(self.get_chunk())
+        capacity = self.capacity
+        self.size = 0
+        for name in COLUMNS:
+            setattr(self, name, None)
+        self.allocate(capacity)
+
+    def node_code(self, data, node):
+        """ Code of a node name, registering the type of new nodes """
+        code = self.node_table.code(node)
+        if code == len(self.node_types):
+            self.node_types.append(data.network_nodes[node].get_type() if node in data.network_nodes else None)
+        return code
+
+    def update_ledger(self, type, cost, costcenter, properties):
+        """ Adding the cost or income and the properties of an event to the KPIs of the cost center """
+        code = self.costcenter_table.code(costcenter)
+        if self.ledger is None or code >= len(self.ledger) or self.ledger.shape[1] != 2 + len(self.properties):
+            ledger = np.zeros((max(16, 2 * (code + 1)), 2 + len(self.properties)))
+            if self.ledger is not None:
+                ledger[:len(self.ledger), :self.ledger.shape[1]] = self.ledger
+            self.ledger = ledger
+        if code not in self.ledger_order:
+            self.ledger_order[code] = None
+        row = self.ledger[code]
+        if cost is not None:
+            if type != LogType.INCOME:
+                row[0] += cost
+            else:
+                row[1] += cost
+        if properties:
+            for p, value in properties.items():
+                row[2 + self.property_index[p]] += value
+
+    def accept(self, type, node, material):
+        """ Deciding whether an entry is stored, called once per entry before its fields are built """
+        if not self.policy.is_enabled(type, node, material):
+            return False
+        n = self.policy.sampling[type.value]
+        if n == 1:
+            return True
+        counter = self.counters[type.value]
+        self.counters[type.value] = counter + 1
+        return counter % n == 0
+
+    def log(self, data, node, type, quantity, material, node2, mode, cost, costcenter, properties, comment=None, level=None):
+        """ Adding a new log entry if the policy accepts it, the KPI ledger is always updated """
+        if costcenter is not None and (cost is not None or properties):
+            self.update_ledger(type, cost, costcenter, properties)
+        if self.accept(type, node, material):
+            self.store(data, node, type, quantity, material, node2, mode, cost, costcenter, properties, comment, level)
+
+    def store(self, data, node, type, quantity, material, node2, mode, cost, costcenter, properties, comment=None, level=None):
+        """ Storing an accepted log entry (without updating the ledger)
+            level: new inventory level of an inventory entry, decoded as the comment of the entry
+        """
+        if self.size == self.capacity:
+            if self.writer is not None:
+                self.flush()
+            else:
+                self.allocate(max(INITIAL_CAPACITY, 2 * self.capacity))
+        i = self.size
+        self.times[i] = data.env.now
+        self.types[i] = type.value
+        self.nodes[i] = self.node_code(data, node)
+        self.quantities[i] = quantity
+        self.materials[i] = self.material_table.code(material)
+        self.node2s[i] = self.node_code(data, node2)
+        self.modes[i] = self.mode_table.code(mode)
+        if cost is not None:
+            self.costs[i] = cost
+        self.costcenters[i] = self.costcenter_table.code(costcenter)
+        if properties:
+            row = self.property_values[i]
+            for p, value in properties.items():
+                row[self.property_index[p]] = value
+        self.comments[i] = self.comment_table.code(comment)
+        if level is not None:
+            self.levels[i] = level
+        self.size = i + 1
+
+    def get_columns(self):
+        """ Decoding the entries in the buffer into object arrays """
+        return self.get_chunk().decode()
+
+    def print_logs(self):
         props = ''
-        for p in cls.properties:
+        for p in self.properties:
             props += p.ljust(15)
         print ('Date'.ljust(12) + \
             'Node'.ljust(15) + \
@@ -76,143 +375,54 @@ class Log:
             'Cost center'.ljust(15) + \
             props + \
             'Comment')
-        for log in cls.logs:
-            print(log)
-
-    def __str__(self):
-        props = ''
-        for p in Log.properties:
-            if p in self.properties.keys():
-                props += str(round(self.properties[p], 2)).ljust(15)
-            else:
-                props += ''.ljust(15)
-        cost = round(self.cost, 2) if self.cost is not None else ''
-        node = self.node[0:15] if self.node is not None else ''
-        node2 = self.node2[0:15] if self.node2 is not None else ''
-        costcenter = self.costcenter[0:15] if self.costcenter is not None else ''
-        return str(self.time).ljust(12) + \
-            str(node).ljust(15) + \
-            str(self.node_type).ljust(20) + \
-            str(self.type.name).ljust(20) + \
-            str(self.quantity).ljust(15) + \
-            str(self.material).ljust(10) + \
-            str(node2).ljust(15) + \
-            str(self.mode if self.mode is not None else '').ljust(10) + \
-            str(cost).ljust(15) + \
-            str(costcenter).ljust(15) + \
-            props + \
-            str(self.comment if self.comment is not None else '')
-
-
-    @classmethod
-    def save_log(cls, filename):
-        file = open(filename, 'w')
-        s = 'Date,Node,Node type,Event,Quantity,Material,Node2,Mode,Cost,Cost center'
-        for p in cls.properties:
-            s += ',' + p
-        s += ',Comment'
-        file.write(s + '\n')
-        for log in cls.logs:
+        columns = self.get_columns()
+        for i in range(self.size):
             props = ''
-            for p in Log.properties:
-                if p in log.properties.keys():
-                    props += ',' + str(round(log.properties[p], 2))
-                else:
-                    props += ','
-            cost = log.cost if log.cost is not None else ''
-            node = log.node if log.node is not None else ''
-            node2 = log.node2 if log.node2 is not None else ''
-            costcenter = log.costcenter if log.costcenter is not None else ''
-            s = str(log.time) + \
-                ',' + str(node) + \
-                ',' + str(log.node_type) + \
-                ',' + str(log.type.name) + \
-                ',' + str(log.quantity) + \
-                ',' + str(log.material) + \
-                ',' + str(node2) + \
-                ',' + str(log.mode if log.mode is not None else '') + \
-                ',' + str(cost) + \
-                ',' + str(costcenter) + \
+            for value in self.property_values[i]:
+                props += (str(round(value, 2)) if not np.isnan(value) else '').ljust(15)
+            cost = round(columns['cost'][i], 2) if not np.isnan(columns['cost'][i]) else ''
+            node = columns['node'][i][0:15] if columns['node'][i] is not None else ''
+            node2 = columns['node2'][i][0:15] if columns['node2'][i] is not None else ''
+            costcenter = columns['cost_center'][i][0:15] if columns['cost_center'][i] is not None else ''
+            print(str(columns['time'][i]).ljust(12) + \
+                str(node).ljust(15) + \
+                str(columns['node_type'][i]).ljust(20) + \
+                str(columns['event'][i]).ljust(20) + \
+                format_number(columns['quantity'][i]).ljust(15) + \
+                str(columns['material'][i]).ljust(10) + \
+                str(node2).ljust(15) + \
+                str(columns['mode'][i] if columns['mode'][i] is not None else '').ljust(10) + \
+                str(cost).ljust(15) + \
+                str(costcenter).ljust(15) + \
                 props + \
-                ',' + str(log.comment if log.comment is not None else '')
-            file.write(s + '\n')
-        file.close()
+                str(columns['comment'][i] if columns['comment'][i] is not None else ''))
+
 
+    def save_log(self, filename):
+        """ Saving the entries in the buffer into a CSV file (gzip compressed for .gz files) """
+        sink = log_sink.CSVSink(filename)
+        sink.open(self.properties)
+        sink.write(self.get_chunk())
+        sink.close()
 
-    @classmethod
-    def get_summary(cls):
-        """ Creating summary of KPIs for cost centers """
+
+    def get_summary(self):
+        """ Creating summary of KPIs for cost centers from the running ledger """
         summary = dict()
-        for log in cls.logs:
-            if log.costcenter is not None and (log.cost is not None or log.properties):
-                data = None
-                if log.costcenter in summary.keys():
-                    data = summary[log.costcenter]
-                else:
-                    data = {'cost': 0, 'income': 0}
-                    for p in cls.properties:
-                        data[p] = 0
-                    summary[log.costcenter] = data
-                if log.cost is not None:
-                    if log.type != LogType.INCOME:
-                        data['cost'] += log.cost
-                    else:
-                        data['income'] += log.cost
-                for p in log.properties.keys():
-                    data[p] += log.properties[p]
+        for code in self.ledger_order.keys():
+            row = self.ledger[code]
+            data = {'cost': float(row[0]), 'income': float(row[1])}
+            for j, p in enumerate(self.properties):
+                data[p] = float(row[2 + j])
+            summary[self.costcenter_table.values[code]] = data
         return summary
 
 
-    @classmethod
-    def get_logtable(cls):
+    def get_logtable(self):
         """ Creating simulation log table for the dashboard """
-        times = []
-        nodes = []
-        node_types = []
-        events = []
-        quantities = []
-        materials = []
-        node2s = []
-        modes = []
-        costs = []
-        cost_centers = []
-        properties = dict()
-        comments = []
-        for p in cls.properties:
-            properties[p] = []
-        for log in cls.logs:
-            cost = None
-            if log.cost is not None:
-                cost = round(log.cost, 2)
-            # times.append(str(floor(log.time)))
-            times.append(str(log.time))
-            nodes.append(log.node)
-            node_types.append(log.node_type)
-            events.append(str(log.type.name))
-            quantities.append(log.quantity)
-            materials.append(log.material)
-            node2s.append(log.node2)
-            modes.append(log.mode)
-            costs.append(cost)
-            cost_centers.append(log.costcenter)
-            for p in cls.properties:
-                if p in log.properties.keys():
-                    properties[p].append(round(log.properties[p], 2))
-                else:
-                    properties[p].append(None)
-            comments.append(log.comment)
-        result = {'time': times,
-                'node': nodes,
-                'node_type': node_types,
-                'event': events,
-                'quantity': quantities,
-                'material': materials,
-                'node2': node2s,
-                'mode': modes,
-                'cost': costs,
-                'cost_center': cost_centers,
-                'comment': comments}
-        for p in cls.properties:
-            result[p] = properties[p]
+        result = self.get_columns()
+        result['time'] = result['time'].astype(str)
+        result['cost'] = np.round(result['cost'], 2)
+        for j, p in enumerate(self.properties):
+            result[p] = np.round(self.property_values[:self.size, j], 2)
         return result
-
@@ -0,0 +1,107 @@
+"""
+Copyright   :   Copyright 2024, HUN-REN SZTAKI
+File name   :   log_sink.py
+Description :   Sinks for streaming the simulation logs into files and databases
+
+Revision history:
+Date            Author          Comment
+----------------------------------------------------------
+18/10/2026      SZTAKI          Initial version
+"""
+
+import csv
+import gzip
+import sqlite3
+import numpy as np
+
+# Column names of the written logs (followed by the operation properties and the comment)
+HEADER = ['Date', 'Node', 'Node type', 'Event', 'Quantity', 'Material', 'Node2', 'Mode', 'Cost', 'Cost center']
+
+
+def optional(values):
+    """ Object array of the values with None instead of NaN """
+    result = values.astype(object)
+    result[np.isnan(values)] = None
+    return result
+
+
+def get_rows(chunk):
+    """ Converting a log chunk into rows of Python values, missing values are None """
+    columns = chunk.decode()
+    quantities = columns['quantity'].astype(object)
+    integers = columns['quantity'] == np.floor(columns['quantity'])
+    quantities[integers] = columns['quantity'][integers].astype(np.int64).astype(object)
+    fields = [columns['time'].astype(str), columns['node'], columns['node_type'], columns['event'], quantities,
+              columns['material'], columns['node2'], columns['mode'], optional(columns['cost']), columns['cost_center']]
+    for j in range(len(chunk.properties)):
+        fields.append(optional(np.round(chunk.property_values[:, j], 2)))
+    fields.append(columns['comment'])
+    return zip(*fields)
+
+
+class LogSink:
+    """ Parent class of the log sinks
+        open and close are called by the simulation, write is called by the writer thread
+    """
+    def open(self, properties):
+        self.properties = properties
+
+    def write(self, chunk):
+        pass
+
+    def close(self):
+        pass
+
+
+class NullSink(LogSink):
+    """ Discarding the logs, only the KPI summary is kept """
+    pass
+
+
+class CSVSink(LogSink):
+    """ Writing the logs into a CSV file, compressed with gzip if the file name ends with .gz """
+    def __init__(self, filename):
+        self.filename = filename
+        self.file = None
+        self.writer = None
+
+    def open(self, properties):
+        LogSink.open(self, properties)
+        if self.filename.endswith('.gz'):
+            self.file = gzip.open(self.filename, 'wt', newline='')
+        else:
+            self.file = open(self.filename, 'w', newline='')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(HEADER + list(properties) + ['Comment'])
+
+    def write(self, chunk):
+        self.writer.writerows(get_rows(chunk))
+
+    def close(self):
+        self.file.close()
+
+
+class SQLiteSink(LogSink):
+    """ Writing the logs into an SQLite table, each buffer is inserted in one transaction """
+    def __init__(self, database, table='SimulationLog'):
+        self.database = database
+        self.table = table
+        self.conn = None
+        self.insert = None
+
+    def open(self, properties):
+        LogSink.open(self, properties)
+        # The connection is used by the writer thread
+        self.conn = sqlite3.connect(self.database, check_same_thread=False)
+        columns = ['"%s"' % c.replace(' ', '') for c in HEADER] + ['"%s"' % p for p in properties] + ['"Comment"']
+        with self.conn:
+            self.conn.execute('DROP TABLE IF EXISTS "%s"' % self.table)
+            self.conn.execute('CREATE TABLE "%s" (%s)' % (self.table, ', '.join(columns)))
+        self.insert = 'INSERT INTO "%s" VALUES (%s)' % (self.table, ', '.join('?' * len(columns)))
+
+    def write(self, chunk):
+        with self.conn:
+            self.conn.executemany(self.insert, get_rows(chunk))
+
+    def close(self):
+        self.conn.close()
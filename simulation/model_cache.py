@@ -0,0 +1,84 @@
+"""
+Copyright   :   Copyright 2024, HUN-REN SZTAKI
+File name   :   model_cache.py
+Description :   Compiled binary cache of the simulation models for the COPROLOOPS simulation
+
+Revision history:
+Date            Author          Comment
+----------------------------------------------------------
+18/10/2026      SZTAKI          Initial version
+"""
+
+import hashlib
+import os
+import pickle
+import sqlite3
+
+# Version of the database schema (date of the latest change in database/whats_new.txt)
+SCHEMA_VERSION = '2026-10-18'
+# Version of the cached model, increase when the model classes change
+CACHE_VERSION = 6
+# Using the cache (False: the model is always read from the database)
+ENABLED = True
+# Extension of the cache file written next to the database
+EXTENSION = '.modelcache'
+# Number of rows hashed together
+CHUNK_SIZE = 10000
+
+
+def get_key(database, layout=(), tables=()):
+    """ Key of the cache: schema and cache versions, the layout of the model and the content hash of the model tables
+        layout: settings the cached model depends on, e.g. the cached attributes
+        tables: tables the model is read from, writing other tables (e.g. the results of the runs) keeps the cache
+        None if the database is not a file (no cache is used)
+    """
+    if not ENABLED or not os.path.isfile(database):
+        return None
+    digest = hashlib.blake2b(digest_size=16)
+    try:
+        conn = sqlite3.connect(database)
+        try:
+            for table in tables:
+                for sql, in conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)):
+                    digest.update(sql.encode())
+                cursor = conn.execute('SELECT * FROM %s' % table)
+                for rows in iter(lambda: cursor.fetchmany(CHUNK_SIZE), []):
+                    digest.update(repr(rows).encode())
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return None
+    return SCHEMA_VERSION, CACHE_VERSION, tuple(layout), digest.hexdigest()
+
+
+def load(database, key, count=1):
+    """ First count sections of the cached model of the database, None if the cache is missing, outdated or unreadable
+        The later sections are not unpickled, e.g. the arrays a run uses from the shared memory.
+        Any error of unpickling is a cache miss, e.g. a model class whose __setstate__ no longer fits the stored state.
+    """
+    try:
+        with open(database + EXTENSION, 'rb') as file:
+            # The key is stored first, so an outdated model is not unpickled
+            if pickle.load(file) != key:
+                return None
+            return [pickle.load(file) for i in range(count)]
+    except Exception:
+        return None
+
+
+def save(database, key, *sections):
+    """ Writing the sections of the model into the cache of the database
+        The file is replaced atomically, so parallel runs never read a partially written cache.
+    """
+    filename = database + EXTENSION
+    temporary = '%s.%s.tmp' % (filename, os.getpid())
+    try:
+        with open(temporary, 'wb') as file:
+            pickle.dump(key, file, protocol=pickle.HIGHEST_PROTOCOL)
+            for section in sections:
+                pickle.dump(section, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary, filename)
+    except OSError:
+        # The simulation does not need the cache, e.g. in a read-only directory
+        if os.path.exists(temporary):
+            os.remove(temporary)
@@ -10,19 +10,29 @@ Date            Author          Comment
 02/09/2025      Egri            First public version
 """
 
-import random
+from array import array
+from bisect import bisect_right
+from collections import deque
+import heapq
+from math import inf
+import numpy as np
 import collection_center
+import consolidation
 import distribution
 import distribution_center
 import production_site
 import customer
 import recovery_plant
-from log import Log, LogType
+from log import LogType
 
 # For debugging
 PRINT_EVENT_TIMES = False
+# Number of the latest demands averaged by the inventory policies (None: all demands since the first one)
+HISTORY_WINDOW = None
 
 class Order:
+    __slots__ = ('customer', 'material', 'quantity', 'route')
+
     def __init__(self, customer, material, quantity, route):
         self.customer = customer
         self.material = material
@@ -30,6 +40,236 @@ class Order:
         self.route = route
 
 
+class Inventory:
+    """ On-hand quantities, inventory position corrections and prices of the materials at a node
+        The values are stored in compact typed arrays indexed by the slot of the material.
+    """
+    __slots__ = ('slots', 'quantities', 'corrections', 'prices')
+
+    def __init__(self):
+        self.slots = dict()
+        self.quantities = array('q')
+        self.corrections = array('q')
+        self.prices = array('d')
+
+    def __contains__(self, material):
+        return material in self.slots
+
+    def keys(self):
+        return self.slots.keys()
+
+    def set(self, material, quantity, price):
+        slot = self.slots.get(material)
+        if slot is None:
+            self.slots[material] = len(self.quantities)
+            self.quantities.append(quantity)
+            self.corrections.append(0)
+            self.prices.append(price)
+        else:
+            self.quantities[slot] = quantity
+            self.prices[slot] = price
+
+    def remove(self, material):
+        """ Removing a material, the slots of the later materials are shifted """
+        slot = self.slots.pop(material)
+        del self.quantities[slot]
+        del self.corrections[slot]
+        del self.prices[slot]
+        for other, other_slot in self.slots.items():
+            if other_slot > slot:
+                self.slots[other] = other_slot - 1
+
+    def get_quantities(self):
+        """ On-hand quantities as a NumPy array in the order of the slots """
+        return np.array(self.quantities, dtype=np.int64)
+
+
+class Load:
+    """ Shipments transported together on a route """
+    __slots__ = ('route', 'orders', 'losses', 'volume', 'mass', 'dispatched')
+
+    def __init__(self, route):
+        self.route = route
+        self.orders = []
+        # Loss is allowed for the shipment in case of a disturbance
+        self.losses = []
+        self.volume = 0
+        self.mass = 0
+        self.dispatched = False
+
+    def add(self, order, isloss, material):
+        self.orders.append(order)
+        self.losses.append(isloss)
+        self.volume += order.quantity * material.volume
+        self.mass += order.quantity * material.mass
+
+
+class OpenOrders:
+    """ Open orders indexed by material, in FIFO order per material
+        The orders are numbered, so the satisfiable orders of several materials are released in their arrival order.
+        A lower bound of the order quantities is kept per material, and the materials whose available quantity may have
+        grown since their last check are marked, so a check only scans the queues where an order can be released.
+    """
+    __slots__ = ('queues', 'minimums', 'changed', 'sequence')
+
+    def __init__(self):
+        self.queues = dict()
+        self.minimums = dict()
+        self.changed = set()
+        self.sequence = 0
+
+    def __len__(self):
+        return sum(len(queue) for queue in self.queues.values())
+
+    def append(self, order):
+        material = order.material
+        queue = self.queues.get(material)
+        if queue is None:
+            queue = deque()
+            self.queues[material] = queue
+            self.minimums[material] = order.quantity
+        elif order.quantity < self.minimums[material]:
+            self.minimums[material] = order.quantity
+        queue.append((self.sequence, order))
+        self.sequence += 1
+        self.changed.add(material)
+
+    def mark(self, material):
+        """ Registering that the available quantity of the material may have grown """
+        if material in self.queues:
+            self.changed.add(material)
+
+    def pop_satisfiable(self, available):
+        """ Removing and returning the open orders that can be satisfied, in their arrival order
+            available: function giving the quantity of a material available for the orders
+            Only the marked materials are checked, an order larger than the remaining quantity is skipped.
+            The scan of a queue stops when the remaining quantity is below the smallest order.
+        """
+        satisfiable = []
+        for material in self.changed:
+            queue = self.queues.get(material)
+            if queue is None:
+                continue
+            inventory = available(material)
+            minimum = self.minimums[material]
+            if inventory < minimum:
+                continue
+            skipped = []
+            while queue and inventory >= minimum:
+                item = queue.popleft()
+                if inventory >= item[1].quantity:
+                    inventory -= item[1].quantity
+                    satisfiable.append(item)
+                else:
+                    skipped.append(item)
+            if not queue:
+                # The whole queue was scanned, the bound becomes exact
+                if not skipped:
+                    del self.queues[material]
+                    del self.minimums[material]
+                    continue
+                self.minimums[material] = min(item[1].quantity for item in skipped)
+            queue.extendleft(reversed(skipped))
+        self.changed.clear()
+        if len(satisfiable) > 1:
+            satisfiable.sort(key=lambda item: item[0])
+        return [order for sequence, order in satisfiable]
+
+
+class ProductionOrders:
+    """ Open production orders indexed by their components (where-used)
+        The orders are numbered, so the orders of several components are checked in their arrival order.
+        A receipt checks the orders waiting for the received material, for the components produced at the site since
+        the previous receipt and the orders registered with enough components (only the inventory position was short).
+    """
+    __slots__ = ('queues', 'sequence', 'produced', 'ready')
+
+    def __init__(self):
+        self.queues = dict()
+        self.sequence = 0
+        self.produced = set()
+        self.ready = []
+
+    def append(self, order, components, ready):
+        for component in components:
+            self.queues.setdefault(component, deque()).append((self.sequence, order))
+        if ready:
+            self.ready.append((self.sequence, order))
+        self.sequence += 1
+
+    def mark_produced(self, material):
+        """ Registering a produced component, the orders waiting for it are checked at the next receipt """
+        if material in self.queues:
+            self.produced.add(material)
+
+    def get_waiting(self, material):
+        """ The orders to be checked at the receipt of the material in their arrival order
+            Orders already started (marked with zero quantity) are dropped from the queues.
+        """
+        waiting = dict(self.ready)
+        self.ready.clear()
+        materials = [material]
+        if self.produced:
+            materials.extend(self.produced)
+            self.produced.clear()
+        for m in materials:
+            queue = self.queues.get(m)
+            if not queue:
+                continue
+            queue = deque(item for item in queue if item[1].quantity != 0)
+            if queue:
+                self.queues[m] = queue
+                waiting.update(queue)
+            else:
+                del self.queues[m]
+        return [waiting[sequence] for sequence in sorted(waiting) if waiting[sequence].quantity != 0]
+
+
+class DemandHistory:
+    """ Demand statistics of a material at a node
+        The running sum, count, first and last time are updated in O(1), the memory does not grow with the horizon.
+        With a window the latest demands are also kept in a ring buffer with their running sum, and the average is
+        computed from the window.
+    """
+    __slots__ = ('sum', 'count', 'first', 'last', 'window', 'times', 'quantities', 'window_sum')
+
+    def __init__(self, window=None):
+        self.sum = 0
+        self.count = 0
+        self.first = None
+        self.last = None
+        self.window = window
+        if window is not None:
+            self.times = np.zeros(window)
+            self.quantities = np.zeros(window)
+            self.window_sum = 0
+
+    def add(self, time, quantity):
+        if self.window is not None:
+            i = self.count % self.window
+            if self.count >= self.window:
+                self.window_sum -= self.quantities[i]
+            self.times[i] = time
+            self.quantities[i] = quantity
+            self.window_sum += quantity
+        self.sum += quantity
+        self.count += 1
+        if self.first is None or time < self.first:
+            self.first = time
+        if self.last is None or time > self.last:
+            self.last = time
+
+    def get_average(self):
+        """ Average daily demand since the first demand, or of the demands in the window when it is full """
+        if self.count == 0:
+            return 0
+        if self.window is None or self.count <= self.window:
+            return self.sum / (self.last - self.first + 1)
+        i = self.count % self.window
+        # The oldest demand of the window is overwritten next, the latest one precedes it
+        return self.window_sum / (self.times[i - 1] - self.times[i] + 1)
+
+
 def get_transportation_time(unit_time, distance):
     """ Computing transportation time """
     # TODO: correct transportation time calculation
@@ -40,26 +280,43 @@ def get_transportation_time(unit_time, distance):
 
 class NetworkNode:
     """ Parent class for network nodes with common attributes and methods """
-    def __init__(self, name, latitude, longitude, costcenter, disturbance):
+    def __init__(self, name, latitude, longitude, costcenter, disturbance, rng):
         self.name = name
         self.latitude = latitude
         self.longitude = longitude
         self.costcenter = costcenter
         self.disturbance = disturbance
-        self.inventory = dict()
+        # Random number stream of the disturbances
+        self.rng = rng
+        self.inventory = Inventory()
         self.route_starts = []
         self.route_ends = []
         self.validity = []
         self.demand_history = dict()
-        self.open_customer_orders = []
-        self.inventory_position_correction = dict()
+        self.open_customer_orders = OpenOrders()
 
     def set_inventory(self, material, quantity, price):
-        self.inventory[material] = {'quantity': quantity, 'price': price}
+        self.inventory.set(material, quantity, price)
+
+    def get_inventory(self, material):
+        """ On-hand inventory of the material """
+        return self.inventory.quantities[self.inventory.slots[material]]
+
+    def get_available(self, material):
+        """ Inventory available for the open customer orders """
+        return self.inventory.quantities[self.inventory.slots[material]]
+
+    def get_price(self, material):
+        return self.inventory.prices[self.inventory.slots[material]]
 
     def change_inventory(self, material, quantity, data):
-        self.inventory[material]['quantity'] += quantity
-        Log.log(data, self.name, LogType.INVENTORY, quantity, material, None, None, None, None, None, comment='New level: %s' % self.inventory[material]['quantity'])
+        slot = self.inventory.slots[material]
+        self.inventory.quantities[slot] += quantity
+        if quantity > 0:
+            self.open_customer_orders.mark(material)
+        # Inventory entries have no cost, so only accepted entries are built
+        if data.log.accept(LogType.INVENTORY, self.name, material):
+            data.log.store(data, self.name, LogType.INVENTORY, quantity, material, None, None, None, None, None, level=self.inventory.quantities[slot])
 
     def get_type(self):
         if isinstance(self, ProductionSite):
@@ -74,46 +331,71 @@ class NetworkNode:
             return 'Recovery plant'
         return 'Network node'
 
-    def is_valid(self, now):
+    def compile_validity(self):
+        """ Sorting and merging the validity intervals, missing bounds are infinite """
+        intervals = []
+        for v in sorted(self.validity, key=lambda v: -inf if v['start'] is None else v['start']):
+            start = -inf if v['start'] is None else v['start']
+            end = inf if v['end'] is None else v['end']
+            if start > end:
+                continue
+            if len(intervals) > 0 and start <= intervals[-1][1]:
+                intervals[-1][1] = max(intervals[-1][1], end)
+            else:
+                intervals.append([start, end])
         if len(self.validity) == 0:
-            return True
-        for v in self.validity:
-            if v['start'] is not None and v['end'] is not None:
-                if v['start'] <= now <= v['end']:
-                    return True
-            elif v['start'] is not None:
-                if v['start'] <= now:
-                    return True
-            elif v['end'] is not None:
-                if now <= v['end']:
-                    return True
-        return False
+            intervals.append([-inf, inf])
+        self.validity_intervals = [tuple(interval) for interval in intervals]
+        self.validity_starts = [start for start, end in self.validity_intervals]
+        self.valid = self.is_valid(0)
+
+    def is_valid(self, now):
+        i = bisect_right(self.validity_starts, now) - 1
+        return i >= 0 and now <= self.validity_intervals[i][1]
+
+    def schedule_validity(self, data):
+        """ Scheduling the opening and closing events of the node
+            The events are scheduled before the simulation starts, so they precede the other events of the same time.
+            A node is open at the end of its validity interval and closes right after it.
+        """
+        now = data.env.now
+        self.valid = self.is_valid(now)
+        for start, end in self.validity_intervals:
+            if now < start < inf:
+                data.env.schedule(start - now, self.set_valid, True, data)
+            if now <= end < inf:
+                data.env.schedule(float(np.nextafter(end, inf)) - now, self.set_valid, False, data)
+
+    def set_valid(self, valid, data):
+        """ Opening or closing the node, the cached candidate routes are dropped """
+        if valid != self.valid:
+            self.valid = valid
+            data.clear_candidates()
 
     def add_demand_history(self, material, quantity, now):
-        if material not in self.demand_history.keys():
-            self.demand_history[material] = [{'time': now, 'quantity': quantity}]
-        else:
-            self.demand_history[material].append({'time': now, 'quantity': quantity})
+        history = self.demand_history.get(material)
+        if history is None:
+            history = DemandHistory(HISTORY_WINDOW)
+            self.demand_history[material] = history
+        history.add(now, quantity)
 
     def get_disturbance(self):
         duration = 0
         loss = 0
-        if self.disturbance is not None and random.random() < self.disturbance.probability:
-            duration = distribution.random_from_distribution(self.disturbance.duration)
+        if self.disturbance is not None and self.rng.bernoulli(self.disturbance.probability):
+            duration = distribution.random_from_distribution(self.disturbance.duration, self.rng)
             loss = self.disturbance.loss
         return duration, loss
 
     def correct_inventory_position(self, material, quantity):
-        if material in self.inventory_position_correction.keys():
-            self.inventory_position_correction[material] += quantity
-        else:
-            self.inventory_position_correction[material] = quantity
+        self.inventory.corrections[self.inventory.slots[material]] += quantity
+        if quantity > 0:
+            # The available quantity of a distribution center depends on the inventory position
+            self.open_customer_orders.mark(material)
 
     def get_inventory_position(self, material):
-        inventory = self.inventory[material]['quantity']
-        if material in self.inventory_position_correction.keys():
-            inventory += self.inventory_position_correction[material]
-        return inventory
+        slot = self.inventory.slots[material]
+        return self.inventory.quantities[slot] + self.inventory.corrections[slot]
 
     def delivery(self, order, data, isloss):
         """ Satisfying an order
@@ -121,7 +403,6 @@ class NetworkNode:
             If delivery fulfils and order, loss may result in missing products and stop in production
         """
         # TODO: instead of isloss, generate new order for lost materials
-        distance = data.get_distance(self.name, order.customer.name)
         mode_name = None
         cost_center = None
         time = 0
@@ -130,25 +411,90 @@ class NetworkNode:
         loss = 0
         properties = dict()
         if order.route is not None:
-            transport_mode = data.transport_modes[order.route.mode]
+            # Distance, cost and properties of the route are precomputed
+            distance = order.route.distance
+            transport_mode = order.route.transport_mode
             mode_name = transport_mode.name
             cost_center = order.route.costcenter
             time = transport_mode.time
-            cost = transport_mode.fixedcost + transport_mode.distancecost * distance
-            for property in transport_mode.properties:
-                properties[property['property']] = property['value'] * distance
+            cost = order.route.transport_cost
+            properties = order.route.transport_properties
             duration, loss = transport_mode.get_disturbance(isloss)
+        else:
+            distance = data.get_distance(self.name, order.customer.name)
         time = get_transportation_time(time, distance)
-        Log.log(data, self.name, LogType.TRANSPORT_START, order.quantity, order.material, order.customer.name, mode_name, None, None, None, None)
+        data.log.log(data, self.name, LogType.TRANSPORT_START, order.quantity, order.material, order.customer.name, mode_name, None, None, None, None)
         if duration > 0:
-            Log.log(data, self.name, LogType.DISTURBANCE, round(order.quantity * loss), order.material, None, None, None, None, None, 'Transportation')
+            data.log.log(data, self.name, LogType.DISTURBANCE, round(order.quantity * loss), order.material, None, None, None, None, None, 'Transportation')
         else:
             duration = 0
-        yield data.env.timeout(time + duration)
+        data.env.schedule(time + duration, self.delivery_end, order, data, mode_name, cost, cost_center, properties, loss)
+
+    def delivery_end(self, order, data, mode_name, cost, cost_center, properties, loss):
+        """ Arrival of a delivery """
         order.quantity *= round(1 - loss)
-        Log.log(data, self.name, LogType.TRANSPORT_END, order.quantity, order.material, order.customer.name, mode_name, cost, cost_center, properties, None)
+        data.log.log(data, self.name, LogType.TRANSPORT_END, order.quantity, order.material, order.customer.name, mode_name, cost, cost_center, properties, None)
         order.customer.shipment_receive(order.material, order.quantity, data)
 
+    def ship(self, order, data, isloss):
+        """ Starting the delivery of an order, consolidated with the other shipments of the route if enabled """
+        if not consolidation.is_consolidated(order.route):
+            self.delivery(order, data, isloss)
+            return
+        load = data.loads.get(order.route)
+        material = data.materials[order.material]
+        if load is not None and not consolidation.fits(load, order.quantity, material):
+            self.dispatch(load, data)
+            load = None
+        if load is None:
+            load = Load(order.route)
+            data.loads[order.route] = load
+            data.env.schedule(consolidation.get_window(load.route), self.close_load, load, data)
+        load.add(order, isloss, material)
+
+    def close_load(self, load, data):
+        """ Dispatching the load at the end of the consolidation window """
+        if not load.dispatched:
+            self.dispatch(load, data)
+
+    def dispatch(self, load, data):
+        load.dispatched = True
+        if data.loads.get(load.route) is load:
+            del data.loads[load.route]
+        self.load_delivery(load, data)
+
+    def load_delivery(self, load, data):
+        """ Transporting a load with one disturbance, one transportation time and one transportation cost
+            The cost and the operation properties are logged with the first shipment.
+        """
+        route = load.route
+        transport_mode = route.transport_mode
+        time = get_transportation_time(transport_mode.time, route.distance)
+        for order in load.orders:
+            data.log.log(data, self.name, LogType.TRANSPORT_START, order.quantity, order.material, order.customer.name, route.mode, None, None, None, None)
+        duration, loss = transport_mode.get_disturbance(any(load.losses))
+        if duration > 0:
+            for order, isloss in zip(load.orders, load.losses):
+                if isloss:
+                    data.log.log(data, self.name, LogType.DISTURBANCE, round(order.quantity * loss), order.material, None, None, None, None, None, 'Transportation')
+        else:
+            duration = 0
+        data.env.schedule(time + duration, self.load_delivery_end, load, data, loss)
+
+    def load_delivery_end(self, load, data, loss):
+        """ Arrival of a load """
+        route = load.route
+        comment = 'Load of %s shipments' % len(load.orders) if len(load.orders) > 1 else None
+        for i, (order, isloss) in enumerate(zip(load.orders, load.losses)):
+            if isloss:
+                order.quantity *= round(1 - loss)
+            if i == 0:
+                data.log.log(data, self.name, LogType.TRANSPORT_END, order.quantity, order.material, order.customer.name, route.mode, route.transport_cost, route.costcenter, route.transport_properties, comment)
+            else:
+                data.log.log(data, self.name, LogType.TRANSPORT_END, order.quantity, order.material, order.customer.name, route.mode, None, None, None, comment)
+        for order in load.orders:
+            order.customer.shipment_receive(order.material, order.quantity, data)
+
     def shipment_receive(self, material, quantity, data):
         pass
 
@@ -161,133 +507,220 @@ class ProductionSite(NetworkNode):
         self.longitude = nn.longitude
         self.costcenter = nn.costcenter
         self.disturbance = nn.disturbance
+        self.rng = nn.rng
         self.inventory = nn.inventory
         self.route_starts = nn.route_starts
         self.route_ends = nn.route_ends
         self.validity = nn.validity
         self.demand_history = nn.demand_history
-        self.inventory_position_correction = nn.inventory_position_correction
         self.open_customer_orders = nn.open_customer_orders
         self.capacity = capacity
         self.produced_materials = dict()
-        self.open_production_orders = []
+        # Open production orders indexed by their components
+        self.open_production_orders = ProductionOrders()
 
     def order_management(self, order, data):
         """ Handling incoming order from distribution centers """
+        self.receive_order(order, data)
+        self.inventory_management(order.material, data, order.quantity)
+
+    def receive_order(self, order, data):
+        """ Delivering the ordered material or registering an open order """
         # TODO: order management without history in order to replace loss of a disturbance
         self.add_demand_history(order.material, order.quantity, data.env.now)
-        price = self.inventory[order.material]['price'] * order.quantity
-        Log.log(data, self.name, LogType.INCOME, order.quantity, order.material, order.customer.name, None, price, self.costcenter, None, None)
+        price = self.get_price(order.material) * order.quantity
+        data.log.log(data, self.name, LogType.INCOME, order.quantity, order.material, order.customer.name, None, price, self.costcenter, None, None)
         # Can deliver instantly only if both the on-hand inventory and the inventory position is enough
-        if self.inventory[order.material]['quantity'] >= order.quantity and self.get_inventory_position(order.material) >= order.quantity:
+        if self.get_inventory(order.material) >= order.quantity and self.get_inventory_position(order.material) >= order.quantity:
             self.change_inventory(order.material, -order.quantity, data)
-            data.env.process(self.delivery(order, data, False))
+            self.ship(order, data, False)
         else:
             self.correct_inventory_position(order.material, -order.quantity)
             if order.material in self.produced_materials.keys():
                 self.open_customer_orders.append(order)
             else:
                 raise Exception("Order for a non-produced material")
-        self.inventory_management(order.material, data, order.quantity)
 
     def inventory_management(self, material, data, order_quantity):
-        """ Controlling production and replenishment """
+        """ Controlling production and replenishment
+            The components produced at the site are planned with an explicit stack instead of recursion: the internal
+            order of a component is planned when its parent reaches it, then the parent continues with its next component.
+            This is the order of the former recursion, cyclic BOMs are rejected at load by the low-level codes.
+            With the low-level code planning (production_site.PLANNING) the requirements are netted by plan_levels.
+        """
         production_quantity = production_site.production_quantity(self, self.demand_history[material], self.get_inventory_position(material), order_quantity)
-        if production_quantity > 0:
-            canproduce = True
-            # Checking availability of necessary components
-            for component in data.materials[material].bom.keys():
-                component_quantity = data.materials[material].bom[component] * production_quantity
-                self.add_demand_history(component, component_quantity, data.env.now)
-                self.correct_inventory_position(component, -component_quantity)
-                # Order if necessary
-                if self.inventory[component]['quantity'] < component_quantity or self.get_inventory_position(component) < 0:
-                    canproduce = False
-                    orderqty = production_site.order_quantity(self, self.demand_history[component], self.get_inventory_position(component), component_quantity)
-                    if orderqty > 0:
-                        self.correct_inventory_position(component, orderqty)
-                        if component in self.produced_materials.keys():
-                            Log.log(data, self.name, LogType.ORDER, orderqty, component, self.name, None, None, None, None, None)
-                            order = Order(self, component, orderqty, None)
-                            self.order_management(order, data)
-                        else:
-                            supplier_route = production_site.select_supplier(self, component, orderqty, data)
-                            if supplier_route is None:
-                                Log.log(data, self.name, LogType.ORDER, orderqty, component, None, None, None, None, None, 'Lost order')
-                            else:
-                                cost = data.network_nodes[supplier_route.source].inventory[component]['price'] * orderqty
-                                Log.log(data, self.name, LogType.ORDER, orderqty, component, supplier_route.source, supplier_route.mode, cost, self.costcenter, None, None)
-                                order = Order(self, component, orderqty, supplier_route)
-                                data.network_nodes[supplier_route.source].order_management(order, data)
-            self.correct_inventory_position(material, production_quantity)
-            if canproduce:
-                self.decreaseInventory(material, production_quantity, data)
-                data.env.process(self.production(material, production_quantity, data))
-            else:
-                order = Order(self, material, production_quantity, None)
-                self.open_production_orders.append(order)
+        if production_quantity <= 0:
+            return
+        if production_site.PLANNING == 'low-level code':
+            self.plan_levels(material, production_quantity, data)
+            return
+        # Production orders being netted: [material, quantity, remaining components, components available]
+        stack = [[material, production_quantity, iter(data.materials[material].bom.items()), True]]
+        while stack:
+            plan = stack[-1]
+            internal = self.plan_components(plan, data)
+            if internal is None:
+                stack.pop()
+                self.finish_planning(plan[0], plan[1], plan[3], data)
+                continue
+            component, orderqty = internal
+            production_quantity = self.order_internal(component, orderqty, data)
+            if production_quantity > 0:
+                stack.append([component, production_quantity, iter(data.materials[component].bom.items()), True])
+
+    def plan_levels(self, material, production_quantity, data):
+        """ Netting the requirements of a production order level by level in low-level code order
+            The requirements of a component from all production orders of the planning are added up, so each material
+            is netted once after all of its parents and ordered with one order. The productions are started or
+            registered after the netting, the deepest ones first.
+        """
+        # Production orders of the planning: [material, quantity, components available]
+        plans = [[material, production_quantity, True]]
+        # Gross requirements of the components and the production orders needing them
+        requirements = dict()
+        levels = []
+        self.explode(plans[0], requirements, levels, data)
+        while levels:
+            level, component = heapq.heappop(levels)
+            quantity, parents = requirements.pop(component)
+            self.add_demand_history(component, quantity, data.env.now)
+            self.correct_inventory_position(component, -quantity)
+            if self.get_inventory(component) >= quantity and self.get_inventory_position(component) >= 0:
+                continue
+            for plan in parents:
+                plan[2] = False
+            orderqty = production_site.order_quantity(self, self.demand_history[component], self.get_inventory_position(component), quantity)
+            if orderqty <= 0:
+                continue
+            self.correct_inventory_position(component, orderqty)
+            if component not in self.produced_materials.keys():
+                self.order_supplier(component, orderqty, data)
+                continue
+            production_quantity = self.order_internal(component, orderqty, data)
+            if production_quantity > 0:
+                plans.append([component, production_quantity, True])
+                self.explode(plans[-1], requirements, levels, data)
+        for plan in reversed(plans):
+            self.finish_planning(plan[0], plan[1], plan[2], data)
+
+    def explode(self, plan, requirements, levels, data):
+        """ Adding the requirements of the components of a production order, new components are queued by level """
+        for component, quantity in data.materials[plan[0]].bom.items():
+            requirement = requirements.get(component)
+            if requirement is None:
+                requirement = [0, []]
+                requirements[component] = requirement
+                heapq.heappush(levels, (data.materials[component].level, component))
+            requirement[0] += quantity * plan[1]
+            requirement[1].append(plan)
+
+    def plan_components(self, plan, data):
+        """ Netting the remaining components of a production order and ordering the purchased ones
+            Stops at the first component produced at the site that has to be ordered and returns it with the quantity.
+        """
+        production_quantity = plan[1]
+        for component, quantity in plan[2]:
+            component_quantity = quantity * production_quantity
+            self.add_demand_history(component, component_quantity, data.env.now)
+            self.correct_inventory_position(component, -component_quantity)
+            # Order if necessary
+            if self.get_inventory(component) < component_quantity or self.get_inventory_position(component) < 0:
+                plan[3] = False
+                orderqty = production_site.order_quantity(self, self.demand_history[component], self.get_inventory_position(component), component_quantity)
+                if orderqty > 0:
+                    self.correct_inventory_position(component, orderqty)
+                    if component in self.produced_materials.keys():
+                        return component, orderqty
+                    self.order_supplier(component, orderqty, data)
+        return None
+
+    def order_internal(self, component, orderqty, data):
+        """ Ordering a component produced at the site, returns the quantity of its production (0: no production) """
+        data.log.log(data, self.name, LogType.ORDER, orderqty, component, self.name, None, None, None, None, None)
+        self.receive_order(Order(self, component, orderqty, None), data)
+        return production_site.production_quantity(self, self.demand_history[component], self.get_inventory_position(component), orderqty)
+
+    def order_supplier(self, component, orderqty, data):
+        """ Ordering a purchased component from the cheapest supplier """
+        supplier_route = production_site.select_supplier(self, component, orderqty, data)
+        if supplier_route is None:
+            data.log.log(data, self.name, LogType.ORDER, orderqty, component, None, None, None, None, None, 'Lost order')
+        else:
+            cost = supplier_route.source_node.get_price(component) * orderqty
+            data.log.log(data, self.name, LogType.ORDER, orderqty, component, supplier_route.source, supplier_route.mode, cost, self.costcenter, None, None)
+            order = Order(self, component, orderqty, supplier_route)
+            supplier_route.source_node.order_management(order, data)
+
+    def finish_planning(self, material, production_quantity, canproduce, data):
+        """ Starting the production or registering a production order after netting all components """
+        self.correct_inventory_position(material, production_quantity)
+        if canproduce:
+            self.decreaseInventory(material, production_quantity, data)
+            self.production(material, production_quantity, data)
+        else:
+            order = Order(self, material, production_quantity, None)
+            self.open_production_orders.append(order, data.materials[material].bom.keys(), self.has_components(order, data))
 
 
     def decreaseInventory(self, material, quantity, data):
         for component in data.materials[material].bom.keys():
             component_quantity = data.materials[material].bom[component] * quantity
             # Each component should have enough inventory at this point!
-            if self.inventory[component]['quantity'] < component_quantity or self.get_inventory_position(component) < 0:
-                raise Exception('Not enough %s at %s: %s/%s' % (component, self.name, self.inventory[component]['quantity'], component_quantity))
+            if self.get_inventory(component) < component_quantity or self.get_inventory_position(component) < 0:
+                raise Exception('Not enough %s at %s: %s/%s' % (component, self.name, self.get_inventory(component), component_quantity))
             self.change_inventory(component, -component_quantity, data)
             self.correct_inventory_position(component, component_quantity)
 
 
     def production(self, material, quantity, data):
         """ Producing materials """
-        Log.log(data, self.name, LogType.PRODUCTION_START, quantity, material, None, None, None, None, None, None)
+        data.log.log(data, self.name, LogType.PRODUCTION_START, quantity, material, None, None, None, None, None, None)
         duration, loss = self.get_disturbance()
         if duration > 0:
-            Log.log(data, self.name, LogType.DISTURBANCE, round(quantity * loss), material, None, None, None, None, None, 'Production')
+            data.log.log(data, self.name, LogType.DISTURBANCE, round(quantity * loss), material, None, None, None, None, None, 'Production')
         else:
             duration = 0
-        yield data.env.timeout(self.produced_materials[material].time + duration)
+        data.env.schedule(self.produced_materials[material].time + duration, self.production_end, material, quantity, data)
+
+    def production_end(self, material, quantity, data):
+        """ Finishing a production """
         cost = self.produced_materials[material].cost * quantity
         costcenter = self.costcenter
         properties = dict()
         for property in self.produced_materials[material].properties:
             properties[property['property']] = property['value'] * quantity
         # TODO: multiply quantity with 1-loss and change inventory position and new production order if necessary
-        Log.log(data, self.name, LogType.PRODUCTION_END, quantity, material, None, None, cost, costcenter, properties, None)
+        data.log.log(data, self.name, LogType.PRODUCTION_END, quantity, material, None, None, cost, costcenter, properties, None)
         self.change_inventory(material, quantity, data)
+        self.open_production_orders.mark_produced(material)
         self.correct_inventory_position(material, -quantity)
         self.check_open_customer_orders(data)
 
     def check_open_customer_orders(self, data):
-        """ Satisfying customer order if possible """
-        delivery = True
-        while delivery:
-            delivery = False
-            for order in self.open_customer_orders[:]:
-                inventory = self.inventory[order.material]['quantity']
-                # if inventory >= order.quantity and self.get_inventory_position(order.material) >= 0:
-                if inventory >= order.quantity:
-                    self.change_inventory(order.material, -order.quantity, data)
-                    self.correct_inventory_position(order.material, order.quantity)
-                    self.open_customer_orders.remove(order)
-                    delivery = True
-                    data.env.process(self.delivery(order, data, False))
+        """ Satisfying customer orders if possible """
+        # if inventory >= order.quantity and self.get_inventory_position(order.material) >= 0:
+        for order in self.open_customer_orders.pop_satisfiable(self.get_available):
+            self.change_inventory(order.material, -order.quantity, data)
+            self.correct_inventory_position(order.material, order.quantity)
+            self.ship(order, data, False)
+
+    def has_components(self, order, data):
+        """ Checking the on-hand inventory of the components of a production order """
+        for component, quantity in data.materials[order.material].bom.items():
+            if self.get_inventory(component) < quantity * order.quantity:
+                return False
+        return True
 
     def shipment_receive(self, material, quantity, data):
-        """ Ordered components arriving, check if any production can start """
+        """ Ordered components arriving, check if any production waiting for the component can start """
         self.change_inventory(material, quantity, data)
         self.correct_inventory_position(material, -quantity)
-        # Check if any production order can be started
-        for order in self.open_production_orders[:]:
-            canproduce = True
-            for component in data.materials[order.material].bom.keys():
-                component_quantity = data.materials[order.material].bom[component] * order.quantity
-                if self.inventory[component]['quantity'] < component_quantity:
-                    canproduce = False
-            if canproduce:
-                self.open_production_orders.remove(order)
+        for order in self.open_production_orders.get_waiting(material):
+            if self.has_components(order, data):
                 self.decreaseInventory(order.material, order.quantity, data)
-                data.env.process(self.production(order.material, order.quantity, data))
+                self.production(order.material, order.quantity, data)
+                # Started orders are dropped from the queues of the other components
+                order.quantity = 0
 
 
 class DistributionCenter(NetworkNode):
@@ -298,12 +731,12 @@ class DistributionCenter(NetworkNode):
         self.longitude = nn.longitude
         self.costcenter = nn.costcenter
         self.disturbance = nn.disturbance
+        self.rng = nn.rng
         self.inventory = nn.inventory
         self.route_starts = nn.route_starts
         self.route_ends = nn.route_ends
         self.validity = nn.validity
         self.demand_history = nn.demand_history
-        self.inventory_position_correction = nn.inventory_position_correction
         self.open_customer_orders = nn.open_customer_orders
         self.capacity = capacity
         self.properties = properties
@@ -312,11 +745,11 @@ class DistributionCenter(NetworkNode):
         """ Handling incoming customer order """
         # TODO: order management without history in order to replace loss of a disturbance
         self.add_demand_history(order.material, order.quantity, data.env.now)
-        price = self.inventory[order.material]['price'] * order.quantity
-        Log.log(data, self.name, LogType.INCOME, order.quantity, order.material, order.customer.name, None, price, self.costcenter, None, None)
-        if self.inventory[order.material]['quantity'] > order.quantity and self.get_inventory_position(order.material) >= order.quantity:
+        price = self.get_price(order.material) * order.quantity
+        data.log.log(data, self.name, LogType.INCOME, order.quantity, order.material, order.customer.name, None, price, self.costcenter, None, None)
+        if self.get_inventory(order.material) > order.quantity and self.get_inventory_position(order.material) >= order.quantity:
             self.change_inventory(order.material, -order.quantity, data)
-            data.env.process(self.delivery(order, data, False))
+            self.ship(order, data, False)
         else:
             self.correct_inventory_position(order.material, -order.quantity)
             self.open_customer_orders.append(order)
@@ -328,30 +761,31 @@ class DistributionCenter(NetworkNode):
         if supplier_qty > 0:
             supplier_route = distribution_center.select_plant(self, material, supplier_qty, data)
             if supplier_route is None:
-                Log.log(data, self.name, LogType.ORDER, supplier_qty, material, None, None, None, None, None, 'Lost order')
+                data.log.log(data, self.name, LogType.ORDER, supplier_qty, material, None, None, None, None, None, 'Lost order')
             else:
-                cost = data.network_nodes[supplier_route.source].inventory[material]['price'] * supplier_qty
-                Log.log(data, self.name, LogType.ORDER, supplier_qty, material, supplier_route.source, supplier_route.mode, cost, self.costcenter, None,None)
+                cost = supplier_route.source_node.get_price(material) * supplier_qty
+                data.log.log(data, self.name, LogType.ORDER, supplier_qty, material, supplier_route.source, supplier_route.mode, cost, self.costcenter, None,None)
                 self.correct_inventory_position(material, supplier_qty)
                 order = Order(self, material, supplier_qty, supplier_route)
-                data.network_nodes[supplier_route.source].order_management(order, data)
+                supplier_route.source_node.order_management(order, data)
+
+    def get_available(self, material):
+        """ Inventory available for the open orders, none while the inventory position is negative """
+        # Delivering does not change the inventory position
+        return self.get_inventory(material) if self.get_inventory_position(material) >= 0 else 0
 
     def shipment_receive(self, material, quantity, data):
         """ Receiving products from the production plants """
         self.change_inventory(material, quantity, data)
         self.correct_inventory_position(material, -quantity)
-        # Checking open orders
-        delivery = True
-        while delivery:
-            delivery = False
-            for order in self.open_customer_orders[:]:
-                inventory = self.inventory[order.material]['quantity']
-                if inventory >= order.quantity and self.get_inventory_position(order.material) >= 0:
-                    self.change_inventory(order.material, -order.quantity, data)
-                    self.correct_inventory_position(order.material, order.quantity)
-                    self.open_customer_orders.remove(order)
-                    delivery = True
-                    data.env.process(self.delivery(order, data, True))
+        self.check_open_customer_orders(data)
+
+    def check_open_customer_orders(self, data):
+        """ Satisfying customer orders if possible """
+        for order in self.open_customer_orders.pop_satisfiable(self.get_available):
+            self.change_inventory(order.material, -order.quantity, data)
+            self.correct_inventory_position(order.material, order.quantity)
+            self.ship(order, data, True)
 
 
 class Customer(NetworkNode):
@@ -362,53 +796,81 @@ class Customer(NetworkNode):
         self.longitude = nn.longitude
         self.costcenter = nn.costcenter
         self.disturbance = nn.disturbance
+        self.rng = nn.rng
         self.inventory = nn.inventory
         self.route_starts = nn.route_starts
         self.route_ends = nn.route_ends
         self.validity = nn.validity
         self.demand_history = nn.demand_history
-        self.inventory_position_correction = nn.inventory_position_correction
         self.open_customer_orders = nn.open_customer_orders
         self.demand = dict()
 
     def order(self, demand, data):
         """ Ordering and returning products """
-        while True:
-            if self.is_valid(data.env.now):
-                # Order
-                qty = distribution.generate_order_quantity(demand, 1, data.env.now)
-                if qty > 0:
-                    route = customer.select_distribution_center(self, demand, qty, data)
-                    if route is None:
-                        Log.log(data, self.name, LogType.ORDER, qty, demand.material, None, None, None, None, None, comment='Lost sale')
-                    else:
-                        cost = data.network_nodes[route.source].inventory[demand.material]['price'] * qty
-                        Log.log(data, self.name, LogType.ORDER, qty, demand.material, route.source, route.mode, cost, self.costcenter, None, None)
-                        order = Order(self, demand.material, qty, route)
-                        data.network_nodes[route.source].order_management(order, data)
-                # Return
-                qty = distribution.generate_order_quantity(demand, demand.waste_production, data.env.now)
-                if qty > 0:
-                    order = Order(None, demand.material, qty, customer.select_collection_center(self, data))
-                    if order.route is None:
-                        Log.log(data, self.name, LogType.RETURN, qty, demand.material, None, None, None, None, None, comment='Lost return')
-                    else:
-                        order.customer = data.network_nodes[order.route.destination]
-                        Log.log(data, self.name, LogType.RETURN, order.quantity, order.material, order.customer.name, None, None, None, None, None)
-                        data.env.process(self.delivery(order, data, True))
-            yield data.env.timeout(demand.frequency)
-            # Print times for debugging
-            if PRINT_EVENT_TIMES:
-                if data.env.now != data.lastday:
-                    if data.env.now % 50 == 0:
-                        print()
-                    print(data.env.now, end=' ')
-                    data.lastday = data.env.now
+        if self.valid:
+            # Order
+            qty = distribution.generate_order_quantity(demand, 1, data.env.now, demand.rng)
+            if qty > 0:
+                route = customer.select_distribution_center(self, demand, qty, data)
+                if route is None:
+                    data.log.log(data, self.name, LogType.ORDER, qty, demand.material, None, None, None, None, None, comment='Lost sale')
+                else:
+                    cost = route.source_node.get_price(demand.material) * qty
+                    data.log.log(data, self.name, LogType.ORDER, qty, demand.material, route.source, route.mode, cost, self.costcenter, None, None)
+                    order = Order(self, demand.material, qty, route)
+                    route.source_node.order_management(order, data)
+            # Return
+            qty = distribution.generate_order_quantity(demand, demand.waste_production, data.env.now, demand.rng)
+            if qty > 0:
+                order = Order(None, demand.material, qty, customer.select_collection_center(self, data))
+                if order.route is None:
+                    data.log.log(data, self.name, LogType.RETURN, qty, demand.material, None, None, None, None, None, comment='Lost return')
+                else:
+                    order.customer = order.route.destination_node
+                    data.log.log(data, self.name, LogType.RETURN, order.quantity, order.material, order.customer.name, None, None, None, None, None)
+                    self.ship(order, data, True)
+
+    def start(self, scheduler):
+        """ Adding the demands to the demand scheduler """
+        for d in self.demand.values():
+            scheduler.add(self, d)
+
+
+class DemandScheduler:
+    """ Generating the orders and returns of all customers
+        The next order times of the demands are kept in a heap and every due demand is served in one wake-up,
+        so the event queue holds one entry instead of one per demand.
+    """
+    def __init__(self):
+        self.heap = []
+        # Demands due at the same time are served in the order they were added
+        self.counter = 0
+
+    def add(self, customer, demand, time=0):
+        heapq.heappush(self.heap, (time, self.counter, customer, demand))
+        self.counter += 1
 
     def start(self, data):
-        """ Starting the demand generating loop """
-        for d in self.demand.values():
-            data.env.process(self.order(d, data))
+        """ Serving the first demands """
+        data.env.schedule(0, self.serve, data)
+
+    def serve(self, data):
+        """ Serving the due demands and scheduling the next wake-up """
+        heap = self.heap
+        now = data.env.now
+        # Print times for debugging
+        if PRINT_EVENT_TIMES:
+            if now != data.lastday:
+                if now % 50 == 0:
+                    print()
+                print(now, end=' ')
+                data.lastday = now
+        while heap and heap[0][0] <= now:
+            time, counter, customer, demand = heapq.heappop(heap)
+            customer.order(demand, data)
+            self.add(customer, demand, now + demand.frequency)
+        if heap:
+            data.env.schedule(heap[0][0] - now, self.serve, data)
 
 
 class CollectionCenter(NetworkNode):
@@ -419,12 +881,12 @@ class CollectionCenter(NetworkNode):
         self.longitude = nn.longitude
         self.costcenter = nn.costcenter
         self.disturbance = nn.disturbance
+        self.rng = nn.rng
         self.inventory = nn.inventory
         self.route_starts = nn.route_starts
         self.route_ends = nn.route_ends
         self.validity = nn.validity
         self.demand_history = nn.demand_history
-        self.inventory_position_correction = nn.inventory_position_correction
         self.open_customer_orders = nn.open_customer_orders
         self.capacity = capacity
         self.properties = properties
@@ -433,16 +895,16 @@ class CollectionCenter(NetworkNode):
         """ Receiving returned materials and transporting them to disassembly plants if necessary """
         self.change_inventory(material, quantity, data)
         self.add_demand_history(material, quantity, data.env.now)
-        qty = collection_center.return_quantity(self, self.demand_history[material], self.inventory[material]['quantity'])
+        qty = collection_center.return_quantity(self, self.demand_history[material], self.get_inventory(material))
         if qty > 0:
             order = Order(None, material, quantity, collection_center.select_plant(self, material, data))
             if order.route is None:
-                Log.log(data, self.name, LogType.RETURN, quantity, material, None, None, None, None, None, comment='Lost return')
+                data.log.log(data, self.name, LogType.RETURN, quantity, material, None, None, None, None, None, comment='Lost return')
             else:
-                order.customer = data.network_nodes[order.route.destination]
-                Log.log(data, self.name, LogType.RETURN, order.quantity, order.material, order.customer.name, None,None, None, None, None)
+                order.customer = order.route.destination_node
+                data.log.log(data, self.name, LogType.RETURN, order.quantity, order.material, order.customer.name, None,None, None, None, None)
                 self.change_inventory(order.material, -order.quantity, data)
-                data.env.process(self.delivery(order, data, True))
+                self.ship(order, data, True)
 
 
 class RecoveryPlant(NetworkNode):
@@ -453,12 +915,12 @@ class RecoveryPlant(NetworkNode):
         self.longitude = nn.longitude
         self.costcenter = nn.costcenter
         self.disturbance = nn.disturbance
+        self.rng = nn.rng
         self.inventory = nn.inventory
         self.route_starts = nn.route_starts
         self.route_ends = nn.route_ends
         self.validity = nn.validity
         self.demand_history = nn.demand_history
-        self.inventory_position_correction = nn.inventory_position_correction
         self.open_customer_orders = nn.open_customer_orders
         self.capacity = capacity
         self.disassembled_materials = dict()
@@ -471,55 +933,51 @@ class RecoveryPlant(NetworkNode):
     def disassembly(self, material, quantity, data):
         """ Disassembling the given quantity of the materials """
         # self.change_inventory(material, -quantity, data)
-        Log.log(data, self.name, LogType.DISASSEMBLY_START, quantity, material, None, None, None, None, None,None)
-        yield data.env.timeout(self.disassembled_materials[material].time)
+        data.log.log(data, self.name, LogType.DISASSEMBLY_START, quantity, material, None, None, None, None, None,None)
+        data.env.schedule(self.disassembled_materials[material].time, self.disassembly_end, material, quantity, data)
+
+    def disassembly_end(self, material, quantity, data):
+        """ Finishing a disassembly """
         cost = self.disassembled_materials[material].cost * quantity
         costcenter = self.costcenter
         properties = dict()
         for property in self.disassembled_materials[material].properties:
             properties[property['property']] = property['value'] * quantity
-        Log.log(data, self.name, LogType.DISASSEMBLY_END, quantity, material, None, None, cost, costcenter, properties, None)
-        for component in self.disassembled_materials[material].inverse_bom.keys():
-            qty = distribution.generate_disassembly_quantity(self.disassembled_materials[material].inverse_bom[component].quantity_distribution, quantity)
+        data.log.log(data, self.name, LogType.DISASSEMBLY_END, quantity, material, None, None, cost, costcenter, properties, None)
+        for component, inverse_bom in self.disassembled_materials[material].inverse_bom.items():
+            qty = distribution.generate_disassembly_quantity(inverse_bom.quantity_distribution, quantity, inverse_bom.rng)
             self.change_inventory(component, qty, data)
         self.check_open_customer_orders(data)
 
 
     def check_open_customer_orders(self, data):
-        """ Satisfying customer order if possible """
-        delivery = True
-        while delivery:
-            delivery = False
-            for order in self.open_customer_orders[:]:
-                inventory = self.inventory[order.material]['quantity']
-                # if inventory >= order.quantity and self.get_inventory_position(order.material) >= 0:
-                if inventory >= order.quantity:
-                    self.change_inventory(order.material, -order.quantity, data)
-                    self.correct_inventory_position(order.material, order.quantity)
-                    self.open_customer_orders.remove(order)
-                    delivery = True
-                    data.env.process(self.delivery(order, data, False))
+        """ Satisfying customer orders if possible """
+        # if inventory >= order.quantity and self.get_inventory_position(order.material) >= 0:
+        for order in self.open_customer_orders.pop_satisfiable(self.get_available):
+            self.change_inventory(order.material, -order.quantity, data)
+            self.correct_inventory_position(order.material, order.quantity)
+            self.ship(order, data, False)
 
 
     def shipment_receive(self, material, quantity, data):
         """ Receiving returned materials and starting disassembly if necessary """
         self.change_inventory(material, quantity, data)
         self.add_demand_history(material, quantity, data.env.now)
-        qty = recovery_plant.disassembly_quantity(self, self.demand_history[material], self.inventory[material]['quantity'])
+        qty = recovery_plant.disassembly_quantity(self, self.demand_history[material], self.get_inventory(material))
         if qty > 0:
             self.decreaseInventory(material, qty, data)
-            data.env.process(self.disassembly(material, qty, data))
+            self.disassembly(material, qty, data)
 
     def order_management(self, order, data):
         """ Handling incoming order from production plants """
-        price = self.inventory[order.material]['price'] * order.quantity
-        Log.log(data, self.name, LogType.INCOME, order.quantity, order.material, order.customer.name, None, price, self.costcenter, None, None)
-        if self.inventory[order.material]['quantity'] < order.quantity:
+        price = self.get_price(order.material) * order.quantity
+        data.log.log(data, self.name, LogType.INCOME, order.quantity, order.material, order.customer.name, None, price, self.costcenter, None, None)
+        if self.get_inventory(order.material) < order.quantity:
             # raise Exception('Not enough inventory in the recovery plant')
             self.correct_inventory_position(order.material, -order.quantity)
             self.open_customer_orders.append(order)
         else:
             self.change_inventory(order.material, -order.quantity, data)
-            data.env.process(self.delivery(order, data, False))
+            self.ship(order, data, False)
 
 
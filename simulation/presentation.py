@@ -23,7 +23,6 @@ import numpy as np
 import pandas as pd
 from math import pi
 import datastruct
-from log import Log
 
 
 def latlon2mercator(lat, lon):
@@ -51,7 +50,7 @@ def node_color(node):
     return 'black'
 
 
-def show_dashboard(nodes, summary):
+def show_dashboard(nodes, summary, log):
     """ Showing the simulation results on the dashboard """
 
     # Map with the nodes and connections
@@ -101,11 +100,8 @@ def show_dashboard(nodes, summary):
     # TODO: Show more interesting KPIs instead
     invs = []
     for node in nodes.values():
-        mats = []
-        qtys = []
-        for mat in node.inventory.keys():
-            mats.append(mat)
-            qtys.append(node.inventory[mat]['quantity'])
+        mats = list(node.inventory.keys())
+        qtys = node.inventory.get_quantities()
         invplot = figure(x_range=mats, title='Inventory at ' + node.name, toolbar_location=None, tools="")
         invplot.vbar(x=mats, top=qtys, width=0.9)
         invplot.visible = False
@@ -125,7 +121,7 @@ def show_dashboard(nodes, summary):
             kpis = ['Cost', 'Income', 'Profit']
             vals = [round(summary[node.costcenter]['cost'], 2), round(summary[node.costcenter]['income'], 2),
                     round(summary[node.costcenter]['income'] - summary[node.costcenter]['cost'], 2)] if node.costcenter in summary.keys() else [0, 0, 0]
-            for prop in Log.properties:
+            for prop in log.properties:
                 kpis.append(prop)
                 vals.append(round(summary[node.costcenter][prop], 2) if node.costcenter in summary.keys() else 0)
             temp_table = {'KPI': kpis, 'Value': vals}
@@ -173,7 +169,7 @@ def show_dashboard(nodes, summary):
         """))
 
     # Simulation log
-    source = ColumnDataSource(pd.DataFrame(Log.get_logtable()))
+    source = ColumnDataSource(log.get_logtable())
     formatter = bokeh.models.NumberFormatter(nan_format='')
     columns = [
         TableColumn(field='time', title='Date'),
@@ -187,14 +183,14 @@ def show_dashboard(nodes, summary):
         TableColumn(field='cost', title='Cost', formatter=formatter),
         TableColumn(field='cost_center', title='Cost center')
     ]
-    for prop in Log.properties:
+    for prop in log.properties:
         columns.append(TableColumn(field=prop, title=prop, formatter=formatter))
     columns.append(TableColumn(field='comment', title='Comment'))
 
     # Pie charts
     pie_charts = []
     pie_charts.append(get_chart(summary, 'cost', 'Cost'))
-    for prop in Log.properties:
+    for prop in log.properties:
         pie_charts.append(get_chart(summary, prop, prop))
 
     # Showing the dashboard with all its elements
@@ -9,10 +9,16 @@ Date            Author          Comment
 29/11/2024      Egri            Initial version
 """
 import network_nodes
+from candidates import Candidate, get_candidates, select_cheapest
 
 # Multipliers for the (s, S) inventory policy (related to the average demand)
 s_MULTIPLIER = 2
 S_MULTIPLIER = 4
+# Planning of the components produced at the site
+# 'depth-first': a component is netted when its parent reaches it (the order of the former recursion)
+# 'low-level code': the requirements of all production orders of a planning are netted level by level (MRP),
+#                   each material once after all of its parents, with one order per component
+PLANNING = 'depth-first'
 
 
 def production_quantity(plant, history, inventory, quantity):
@@ -21,6 +27,7 @@ def production_quantity(plant, history, inventory, quantity):
     """
     return order_quantity(plant, history, inventory, quantity)
 
+
 def order_quantity(plant, history, inventory, quantity):
     """ Order up to S if inventory is below s
         'quantity' can be used for lot-for-lot policy
@@ -35,55 +42,35 @@ def getsS(plant, history):
     """ Sample (s,S) levels for the production site
         Average demand multiplied by constants, independently of the production site
     """
-    sum = 0
-    first = None
-    last = None
-    for demand in history:
-        time = demand['time']
-        quantity = demand['quantity']
-        sum += quantity
-        if first is None or time < first:
-            first = time
-        if last is None or time > last:
-            last = time
-    if first is None or last is None:
-        return 0, 0
-    return round(s_MULTIPLIER * sum / (last - first + 1)), round(S_MULTIPLIER * sum / (last - first + 1))
+    average = history.get_average()
+    return round(s_MULTIPLIER * average), round(S_MULTIPLIER * average)
 
 
-def select_supplier(plant, material, quantity, data):
-    """ Selecting plant to order from """
-    best_route = None
-    best_cost = None
+def get_suppliers(plant, material, data):
+    """ Production sites producing the material and recovery plants having it in the inventory """
+    candidates = []
     for route in plant.route_ends:
-        node = data.network_nodes[route.source]
-        # Checking production plants
-        if isinstance(node, network_nodes.ProductionSite) and node.is_valid(data.env.now):
+        node = route.source_node
+        if isinstance(node, network_nodes.ProductionSite):
             # Check if plant produces material
             if material not in node.produced_materials.keys():
                 continue
-            transport_mode = data.transport_modes[route.mode]
-            distance = data.get_distance(plant.name, route.source)
-            cost = quantity * node.inventory[material]['price']
-            # Adding transportation cost if paid by the buyer plant
-            if route.costcenter == plant.name:
-                cost += transport_mode.fixedcost + transport_mode.distancecost * distance
-            if best_route is None or cost < best_cost:
-                best_route = route
-                best_cost = cost
-        # Checking recovery plants
-        elif isinstance(node, network_nodes.RecoveryPlant) and node.is_valid(data.env.now):
-            # Check if plant has inventory
-            if material not in node.inventory.keys() or node.inventory[material]['quantity'] < quantity:
+        elif isinstance(node, network_nodes.RecoveryPlant):
+            if material not in node.inventory.keys():
                 continue
-            transport_mode = data.transport_modes[route.mode]
-            distance = data.get_distance(plant.name, route.source)
-            cost = quantity * node.inventory[material]['price']
-            # Adding transportation cost if paid by the buyer plant
-            if route.costcenter == plant.name:
-                cost += transport_mode.fixedcost + transport_mode.distancecost * distance
-            if best_route is None or cost < best_cost:
-                best_route = route
-                best_cost = cost
-    return best_route
+        else:
+            continue
+        cost = 0
+        # Adding transportation cost if paid by the buyer plant
+        if route.costcenter == plant.name:
+            cost = route.transport_cost
+        candidates.append(Candidate(route, node, node.get_price(material), cost))
+    return candidates
 
+
+def select_supplier(plant, material, quantity, data):
+    """ Selecting plant to order from """
+    candidates = get_candidates(data, ('supplier', plant.name, material), lambda: get_suppliers(plant, material, data))
+    # Recovery plants have to have enough inventory
+    return select_cheapest(candidates, quantity,
+                           lambda node: not isinstance(node, network_nodes.RecoveryPlant) or node.get_inventory(material) >= quantity)
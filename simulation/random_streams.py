@@ -0,0 +1,124 @@
+"""
+Copyright   :   Copyright 2024, HUN-REN SZTAKI
+File name   :   random_streams.py
+Description :   Dedicated random number streams of the simulation entities
+
+Revision history:
+Date            Author          Comment
+----------------------------------------------------------
+18/10/2026      SZTAKI          Initial version
+"""
+
+import hashlib
+from math import floor, inf, log, log1p
+import numpy as np
+
+# Largest number of variates drawn at once from a generator
+BLOCK_SIZE = 4096
+# Size of the first block of a stream
+INITIAL_BLOCK_SIZE = 16
+
+
+def get_key(*key):
+    """ Stable integer key of an entity (independent of the Python hash seed) """
+    digest = hashlib.blake2b('\x1f'.join(str(k) for k in key).encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little')
+
+
+class RandomStream:
+    """ Random number stream of one entity
+        The variates are drawn from the generator in blocks and handed out one at a time. The blocks start small
+        and grow up to BLOCK_SIZE, so rarely used streams do not draw (and store) thousands of unused variates.
+        Antithetic streams return 1-u instead of the uniform u and mirror the normal variates
+        The generator is created at the first draw, so unused streams cost nothing at startup.
+    """
+    def __init__(self, entropy, spawn_key, antithetic=False):
+        self.entropy = entropy
+        self.spawn_key = spawn_key
+        self.antithetic = antithetic
+        self._generator = None
+        self.uniforms = []
+        self.uniform_index = 0
+        self.uniform_block = INITIAL_BLOCK_SIZE
+        self.normals = []
+        self.normal_index = 0
+        self.normal_block = INITIAL_BLOCK_SIZE
+        # Remaining trials until the next success of the Bernoulli trials per probability
+        self.countdowns = dict()
+
+    @property
+    def generator(self):
+        if self._generator is None:
+            self._generator = np.random.default_rng(np.random.SeedSequence(self.entropy, spawn_key=self.spawn_key))
+        return self._generator
+
+    def random(self):
+        if self.uniform_index == len(self.uniforms):
+            self.uniforms = self.generator.random(self.uniform_block).tolist()
+            self.uniform_index = 0
+            self.uniform_block = min(2 * self.uniform_block, BLOCK_SIZE)
+        u = self.uniforms[self.uniform_index]
+        self.uniform_index += 1
+        return 1 - u if self.antithetic else u
+
+    def uniform(self, low, high):
+        return low + (high - low) * self.random()
+
+    def normal(self, avg, std):
+        if self.normal_index == len(self.normals):
+            self.normals = self.generator.standard_normal(self.normal_block).tolist()
+            self.normal_index = 0
+            self.normal_block = min(2 * self.normal_block, BLOCK_SIZE)
+        z = self.normals[self.normal_index]
+        self.normal_index += 1
+        return avg - std * z if self.antithetic else avg + std * z
+
+    def random_array(self, size):
+        """ Array of uniform variates drawn directly from the generator
+            For batch sampling, a stream should use either the arrays or the single variates.
+        """
+        u = self.generator.random(size)
+        return 1 - u if self.antithetic else u
+
+    def standard_normal_array(self, size):
+        """ Array of standard normal variates drawn directly from the generator """
+        z = self.generator.standard_normal(size)
+        return -z if self.antithetic else z
+
+    def bernoulli(self, probability):
+        """ Bernoulli trial with geometric skip-ahead
+            The number of trials until the next success is drawn at once, the trials in between do not use
+            the generator.
+        """
+        countdown = self.countdowns.get(probability)
+        if countdown is None:
+            countdown = self.geometric(probability)
+        countdown -= 1
+        if countdown == 0:
+            self.countdowns[probability] = self.geometric(probability)
+            return True
+        self.countdowns[probability] = countdown
+        return False
+
+    def geometric(self, probability):
+        """ Number of trials until the first success (inversion of a uniform variate) """
+        if probability <= 0:
+            return inf
+        if probability >= 1:
+            return 1
+        return floor(log(1 - self.random()) / log1p(-probability)) + 1
+
+
+class RandomStreams:
+    """ Independent, reproducible random number streams keyed by the entities
+        The stream of an entity depends only on the seed and the key of the entity, so two runs
+        with the same seed (e.g. two scenarios) see the same demands and disturbances (common random numbers).
+        seed: integer, numpy SeedSequence or None for a random seed
+    """
+    def __init__(self, seed=None, antithetic=False):
+        self.seed_sequence = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+        self.antithetic = antithetic
+
+    def get_stream(self, *key):
+        """ Stream of the entity identified by the key, e.g. ('demand', customer, material) """
+        return RandomStream(self.seed_sequence.entropy, self.seed_sequence.spawn_key + (get_key(*key),), self.antithetic)
@@ -25,18 +25,5 @@ def getS(recovery, history):
     """ Sample target level for the recovery plant
         Average demand multiplied by a constant, independently of the plant
     """
-    sum = 0
-    first = None
-    last = None
-    for demand in history:
-        time = demand['time']
-        quantity = demand['quantity']
-        sum += quantity
-        if first is None or time < first:
-            first = time
-        if last is None or time > last:
-            last = time
-    if first is None or last is None:
-        return 0
-    return round(S_MULTIPLIER * sum / (last - first + 1))
+    return round(S_MULTIPLIER * history.get_average())
 
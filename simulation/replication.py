@@ -0,0 +1,280 @@
+"""
+Copyright   :   Copyright 2024, HUN-REN SZTAKI
+File name   :   replication.py
+Description :   Parallel Monte Carlo replications of the COPROLOOPS simulation
+
+Revision history:
+Date            Author          Comment
+----------------------------------------------------------
+18/10/2026      SZTAKI          Initial version
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+import datetime
+from math import pi, sqrt, tan
+import os
+from statistics import NormalDist
+import numpy as np
+import shared_model
+from log import LogPolicy
+from result_store import ResultStore
+from simulation_run import SimulationRun
+
+# Simulation model data
+DATABASE = 'simulationdb'
+# Simulation horizon
+HORIZON = 365
+# Number of replications (maximum number in case of sequential stopping)
+REPLICATIONS = 100
+# Seed of the replications, the same seed reproduces the same replications
+SEED = 0
+# Confidence level of the intervals
+CONFIDENCE = 0.95
+# Sequential stopping: required relative half-width of the confidence intervals (None: fixed number of replications)
+RELATIVE_HALFWIDTH = None
+# Antithetic variates: the replications are run in antithetic pairs
+ANTITHETIC = False
+# Sequential stopping: minimum number of replications before checking the confidence intervals
+MIN_REPLICATIONS = 10
+# Sharing the immutable master data arrays of the model among the worker processes
+SHARED_MEMORY = True
+# Database storing the KPIs of every replication (None: the KPIs are not stored)
+# It can be the model database itself, the model cache depends only on the model tables
+RESULT_DATABASE = None
+# Scenario of the database applied on the model, also the scenario ID of the stored replications (None: base model)
+SCENARIO = None
+
+# Shared arrays of the model attached by the worker process
+worker_model = None
+
+
+def t_quantile(p, df):
+    """ Quantile of the Student's t-distribution
+        Exact for 1 and 2 degrees of freedom, Cornish-Fisher expansion otherwise
+    """
+    if df == 1:
+        return tan(pi * (p - 0.5))
+    if df == 2:
+        return (2 * p - 1) / sqrt(2 * p * (1 - p))
+    z = NormalDist().inv_cdf(p)
+    g1 = (z ** 3 + z) / 4
+    g2 = (5 * z ** 5 + 16 * z ** 3 + 3 * z) / 96
+    g3 = (3 * z ** 7 + 19 * z ** 5 + 17 * z ** 3 - 15 * z) / 384
+    g4 = (79 * z ** 9 + 776 * z ** 7 + 1482 * z ** 5 - 1920 * z ** 3 - 945 * z) / 92160
+    return z + g1 / df + g2 / df ** 2 + g3 / df ** 3 + g4 / df ** 4
+
+
+def get_kpis(summary):
+    """ Flattening a KPI summary into {(cost center, KPI): value}, profit is added for each cost center """
+    kpis = dict()
+    for costcenter, values in summary.items():
+        for kpi, value in values.items():
+            kpis[(costcenter, kpi)] = value
+        kpis[(costcenter, 'profit')] = values['income'] - values['cost']
+    return kpis
+
+
+def init_worker(name, layout):
+    """ Attaching the worker process to the shared arrays of the model """
+    global worker_model
+    worker_model = shared_model.attach(name, layout)
+
+
+def create_executor(database, starttime, workers):
+    """ Process pool of the replications and the shared arrays of the model (None without shared memory) """
+    if not SHARED_MEMORY:
+        return ProcessPoolExecutor(max_workers=workers), None
+    model = shared_model.create_model(database, starttime)
+    return ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(model.name, model.layout)), model
+
+
+def release(model):
+    """ Freeing the shared arrays after the workers finished """
+    if model is not None:
+        model.close()
+        model.unlink()
+
+
+def run_replication(database, horizon, starttime, seed, antithetic=False, result_database=None, scenario=None):
+    """ Running one replication of the scenario without detailed logs and returning its KPIs
+        The KPIs are also stored in the result database if it is given, the connection is closed after the write
+    """
+    run = SimulationRun(database, horizon, starttime, seed=seed, log_policy=LogPolicy(types=[]), antithetic=antithetic,
+                        shared=worker_model, scenario=scenario)
+    summary = run.run()
+    if result_database is not None:
+        with ResultStore(result_database) as store:
+            run.store_results(store)
+    return get_kpis(summary)
+
+
+def get_seeds(seed, n, first=0, antithetic=False):
+    """ Independent seed streams and antithetic flags of the replications first, ..., first+n-1
+        With antithetic variates the replications 2k and 2k+1 use the same seed stream, the latter antithetically
+    """
+    if not antithetic:
+        return np.random.SeedSequence(seed).spawn(first + n)[first:], [False] * n
+    seeds = np.random.SeedSequence(seed).spawn((first + n + 1) // 2)
+    return [seeds[i // 2] for i in range(first, first + n)], [i % 2 == 1 for i in range(first, first + n)]
+
+
+def get_pair_means(replications):
+    """ Averaging the KPIs of the antithetic pairs, these averages are independent observations """
+    means = []
+    for first, second in zip(replications[0::2], replications[1::2]):
+        keys = dict.fromkeys(list(first.keys()) + list(second.keys()))
+        means.append({key: (first.get(key, 0) + second.get(key, 0)) / 2 for key in keys})
+    return means
+
+
+def get_interval(n, mean, std, confidence):
+    """ Statistics with the confidence interval of the mean """
+    halfwidth = t_quantile(0.5 + confidence / 2, n - 1) * std / sqrt(n) if n > 1 else float('inf')
+    return {'n': n, 'mean': mean, 'std': std, 'halfwidth': halfwidth, 'low': mean - halfwidth, 'high': mean + halfwidth}
+
+
+def get_statistics(values, confidence=CONFIDENCE):
+    """ Mean, standard deviation and confidence interval of the values """
+    n = len(values)
+    std = float(np.std(values, ddof=1)) if n > 1 else 0.0
+    return get_interval(n, float(np.mean(values)), std, confidence)
+
+
+class RunningStatistics:
+    """ Incremental mean and variance of a KPI (Welford's algorithm) """
+    def __init__(self, n=0):
+        # A KPI missing from the first n replications had zero values
+        self.n = n
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def add(self, value):
+        self.n += 1
+        delta = value - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (value - self.mean)
+
+    def get_statistics(self, confidence=CONFIDENCE):
+        std = sqrt(self.m2 / (self.n - 1)) if self.n > 1 else 0.0
+        return get_interval(self.n, self.mean, std, confidence)
+
+    def is_converged(self, relative_halfwidth, confidence=CONFIDENCE):
+        """ Checking whether the half-width of the confidence interval is small enough relative to the mean """
+        statistics = self.get_statistics(confidence)
+        return statistics['halfwidth'] <= relative_halfwidth * abs(statistics['mean'])
+
+
+def summarize(replications, confidence=CONFIDENCE):
+    """ Statistics of the KPIs per cost center, missing KPIs of a replication are zero """
+    keys = dict()
+    for kpis in replications:
+        for key in kpis.keys():
+            keys[key] = None
+    statistics = dict()
+    for costcenter, kpi in keys.keys():
+        values = [kpis.get((costcenter, kpi), 0) for kpis in replications]
+        statistics.setdefault(costcenter, dict())[kpi] = get_statistics(values, confidence)
+    return statistics
+
+
+def run_replications(database, horizon, n, seed=SEED, starttime=None, workers=None, confidence=CONFIDENCE,
+                     antithetic=False, result_database=RESULT_DATABASE, scenario=SCENARIO):
+    """ Running n replications on a process pool and returning the KPI statistics per cost center
+        Replication i always uses the i-th seed stream of the seed, independently of the number of workers.
+        Using the same seed for two models compares them with common random numbers.
+        antithetic: running n antithetic pairs, the statistics are computed from the pair averages
+        scenario: scenario of the database applied on the model (None: base model)
+        result_database: storing the KPIs of each replication with the scenario ID (None: not stored)
+    """
+    if starttime is None:
+        starttime = datetime.datetime.today()
+    if workers is None:
+        workers = os.cpu_count()
+    if antithetic:
+        n *= 2
+    seeds, antithetics = get_seeds(seed, n, antithetic=antithetic)
+    executor, model = create_executor(database, starttime, workers)
+    try:
+        with executor:
+            replications = list(executor.map(run_replication, [database] * n, [horizon] * n, [starttime] * n, seeds,
+                                             antithetics, [result_database] * n, [scenario] * n,
+                                             chunksize=max(1, n // (4 * workers))))
+    finally:
+        release(model)
+    if antithetic:
+        replications = get_pair_means(replications)
+    return summarize(replications, confidence)
+
+
+def run_until_converged(database, horizon, relative_halfwidth, kpis=None, max_replications=1000,
+                        min_replications=MIN_REPLICATIONS, batch_size=None, seed=SEED, starttime=None, workers=None,
+                        confidence=CONFIDENCE, antithetic=False, result_database=RESULT_DATABASE, scenario=SCENARIO):
+    """ Running batches of replications until the confidence intervals of the selected KPIs are narrow enough
+        kpis: list of (cost center, KPI) pairs to check, None checks every KPI
+        antithetic: running antithetic pairs, the replication numbers count the pairs
+        scenario: scenario of the database applied on the model (None: base model)
+        result_database: storing the KPIs of each replication with the scenario ID (None: not stored)
+        The replications of a batch run in parallel and are added to the statistics in their order,
+        so the same seed gives the same number of replications and the same statistics.
+    """
+    if starttime is None:
+        starttime = datetime.datetime.today()
+    if workers is None:
+        workers = os.cpu_count()
+    if batch_size is None:
+        batch_size = workers
+    # Number of simulation runs per observation
+    runs = 2 if antithetic else 1
+    statistics = dict()
+    n = 0
+    executor, model = create_executor(database, starttime, workers)
+    try:
+        with executor:
+            while n < max_replications:
+                size = min(max(1, batch_size // runs), max_replications - n)
+                seeds, antithetics = get_seeds(seed, size * runs, n * runs, antithetic)
+                replications = list(executor.map(run_replication, [database] * size * runs, [horizon] * size * runs,
+                                                 [starttime] * size * runs, seeds, antithetics,
+                                                 [result_database] * size * runs, [scenario] * size * runs))
+                if antithetic:
+                    replications = get_pair_means(replications)
+                for replication in replications:
+                    for key in replication.keys():
+                        if key not in statistics:
+                            statistics[key] = RunningStatistics(n)
+                    for key, running in statistics.items():
+                        running.add(replication.get(key, 0))
+                    n += 1
+                if n >= min_replications:
+                    keys = kpis if kpis is not None else statistics.keys()
+                    if all(key in statistics and statistics[key].is_converged(relative_halfwidth, confidence) for key in keys):
+                        break
+    finally:
+        release(model)
+    result = dict()
+    for (costcenter, kpi), running in statistics.items():
+        result.setdefault(costcenter, dict())[kpi] = running.get_statistics(confidence)
+    return result
+
+
+def print_statistics(statistics):
+    """ Printing the mean and the confidence interval of the KPIs """
+    print('Cost_center'.ljust(15) + 'KPI'.ljust(15) + 'Mean'.ljust(20) + 'Std'.ljust(20) + 'CI low'.ljust(20) + 'CI high')
+    for costcenter, kpis in statistics.items():
+        for kpi, s in kpis.items():
+            print(costcenter.replace(' ', '_').ljust(15) + kpi.ljust(15) + str(round(s['mean'], 2)).ljust(20) +
+                  str(round(s['std'], 2)).ljust(20) + str(round(s['low'], 2)).ljust(20) + str(round(s['high'], 2)))
+
+
+def main():
+    """ Running the replications and printing the KPI statistics """
+    if RELATIVE_HALFWIDTH is None:
+        statistics = run_replications(DATABASE, HORIZON, REPLICATIONS, antithetic=ANTITHETIC)
+    else:
+        statistics = run_until_converged(DATABASE, HORIZON, RELATIVE_HALFWIDTH, max_replications=REPLICATIONS,
+                                         antithetic=ANTITHETIC)
+    print_statistics(statistics)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""
+Copyright   :   Copyright 2024, HUN-REN SZTAKI
+File name   :   result_store.py
+Description :   Storing the KPIs of the simulation runs in SQLite for the COPROLOOPS simulation
+
+Revision history:
+Date            Author          Comment
+----------------------------------------------------------
+18/10/2026      SZTAKI          Initial version
+"""
+
+import datetime
+import sqlite3
+import numpy as np
+
+# Time a writer waits for the lock of another writer (seconds)
+TIMEOUT = 60
+
+# Result tables of database/create.sql, created if the database does not have them yet
+TABLES = ['''CREATE TABLE IF NOT EXISTS SimulationRun (
+	ID INTEGER PRIMARY KEY,
+	Scenario TEXT,
+	Seed TEXT,
+	Horizon INTEGER NOT NULL,
+	StartTime DATE,
+	Timestamp DATETIME NOT NULL
+)''', '''CREATE TABLE IF NOT EXISTS SimulationResult (
+	ID INTEGER PRIMARY KEY,
+	RunID INTEGER,
+	CostCenter TEXT NOT NULL,
+	KPI TEXT NOT NULL,
+	Value REAL NOT NULL,
+	FOREIGN KEY (RunID) REFERENCES SimulationRun(ID),
+	FOREIGN KEY (CostCenter) REFERENCES CostCenter(Name)
+)''']
+INDEXES = ['CREATE INDEX IF NOT EXISTS SimulationResultRun ON SimulationResult(RunID, CostCenter, KPI)',
+           'CREATE INDEX IF NOT EXISTS SimulationRunScenario ON SimulationRun(Scenario)']
+
+
+def get_seed_text(seed):
+    """ Text of a seed reproducing the run: the integer or the entropy and spawn key of a SeedSequence """
+    if seed is None:
+        return None
+    if isinstance(seed, np.random.SeedSequence):
+        return '%s/%s' % (seed.entropy, ','.join(str(key) for key in seed.spawn_key))
+    return str(seed)
+
+
+class ResultStore:
+    """ Storing the KPI summaries of the simulation runs in the SimulationRun and SimulationResult tables
+        The database is used in WAL mode, so parallel writers (e.g. replication workers) do not block the readers.
+        Each run is written in one short transaction with one executemany.
+        Used as a context manager the connection is closed at the end, so the WAL files are removed.
+    """
+    def __init__(self, database):
+        # Transactions are started explicitly
+        self.conn = sqlite3.connect(database, timeout=TIMEOUT, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.create_tables()
+
+    def create_tables(self):
+        """ Creating the result tables and indexes, older SimulationResult tables get the RunID field """
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            for table in TABLES:
+                self.conn.execute(table)
+            if 'RunID' not in [column[1] for column in self.conn.execute('PRAGMA table_info(SimulationResult)')]:
+                self.conn.execute('ALTER TABLE SimulationResult ADD COLUMN RunID INTEGER REFERENCES SimulationRun(ID)')
+            for index in INDEXES:
+                self.conn.execute(index)
+            self.conn.execute('COMMIT')
+        except Exception:
+            self.conn.execute('ROLLBACK')
+            raise
+
+    def save(self, summary, horizon, seed=None, scenario=None, starttime=None):
+        """ Storing the KPI summary of a run and returning the ID of the run """
+        rows = [(costcenter, kpi, float(value)) for costcenter, kpis in summary.items() for kpi, value in kpis.items()]
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            cursor = self.conn.execute('INSERT INTO SimulationRun (Scenario, Seed, Horizon, StartTime, Timestamp) VALUES (?, ?, ?, ?, ?)',
+                                       (scenario, get_seed_text(seed), horizon,
+                                        starttime.isoformat() if starttime is not None else None,
+                                        datetime.datetime.now().isoformat()))
+            run = cursor.lastrowid
+            self.conn.executemany('INSERT INTO SimulationResult (RunID, CostCenter, KPI, Value) VALUES (?, ?, ?, ?)',
+                                  [(run,) + row for row in rows])
+            self.conn.execute('COMMIT')
+        except Exception:
+            self.conn.execute('ROLLBACK')
+            raise
+        return run
+
+    def get_results(self, run):
+        """ KPI summary of a stored run, {cost center: {KPI: value}} """
+        summary = dict()
+        for costcenter, kpi, value in self.conn.execute('SELECT CostCenter, KPI, Value FROM SimulationResult WHERE RunID = ?', (run,)):
+            summary.setdefault(costcenter, dict())[kpi] = value
+        return summary
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
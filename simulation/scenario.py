@@ -0,0 +1,198 @@
+"""
+Copyright   :   Copyright 2024, HUN-REN SZTAKI
+File name   :   scenario.py
+Description :   Scenario overlays applied on a loaded model of the COPROLOOPS simulation
+
+Revision history:
+Date            Author          Comment
+----------------------------------------------------------
+18/10/2026      SZTAKI          Initial version
+"""
+
+import sqlite3
+from datastruct import Demand, ProducedMaterial, Route
+from network_nodes import Customer, ProductionSite
+
+# Fields of the overlay tables after Scenario and Operation, the overlay of table X is ScenarioX
+OVERLAY_FIELDS = {
+    'Validity': ('NetworkNode', 'Start', 'End'),
+    'Route': ('Source', 'Destination', 'TransportMode', 'CostCenter'),
+    'Inventory': ('Material', 'NetworkNode', 'Quantity', 'Price'),
+    'Demand': ('Customer', 'Material', 'Frequency', 'Quantity', 'IsBacklog', 'AdditionalTrend', 'MultiplicativeTrend',
+               'Duedate', 'WasteProduction'),
+    'ProducedMaterial': ('ProductionSite', 'MaterialName', 'Cost', 'Time', 'CapacityUsage', 'Price', 'OperationPropertyID'),
+}
+# Operations of the overlay records: 'set' adds or overrides a record, 'delete' removes it
+OPERATIONS = ('set', 'delete')
+
+
+class Scenario:
+    """ Delta records of a scenario over the base model
+        The records are read once and applied in their order on a freshly loaded DataStructure before the run,
+        so evaluating a scenario needs neither a copy of the database nor a second model.
+        changes: [(table, operation, record)]
+    """
+    def __init__(self, name, changes):
+        self.name = name
+        self.changes = changes
+
+    def apply(self, data):
+        """ Applying the changes on the data structure
+            The validity records of a node replace its base intervals together, so a node can have several intervals.
+        """
+        for name in dict.fromkeys(record[0] for table, operation, record in self.changes if table == 'Validity'):
+            get_node(data, name).validity = []
+        for table, operation, record in self.changes:
+            if operation not in OPERATIONS:
+                raise Exception('Unknown scenario operation %s in %s' % (operation, self.name))
+            APPLY[table](data, operation, *record)
+        # The candidate routes and the derived routing tables depend on the changed records
+        data.clear_candidates()
+        if any(table == 'Demand' for table, operation, record in self.changes):
+            # The shared demand parameters belong to the base model
+            data.shared = None
+
+
+def read_scenario(database, name):
+    """ Reading the delta records of a scenario """
+    conn = sqlite3.connect(database)
+    cursor = conn.cursor()
+    cursor.execute('SELECT Name FROM Scenario WHERE Name = ?', (name,))
+    if cursor.fetchone() is None:
+        conn.close()
+        raise Exception('Cannot find scenario %s' % name)
+    changes = []
+    for table, fields in OVERLAY_FIELDS.items():
+        cursor.execute('SELECT Operation, %s FROM Scenario%s WHERE Scenario = ? ORDER BY rowid' % (', '.join(fields), table), (name,))
+        for operation, *record in cursor.fetchall():
+            changes.append((table, operation, record))
+    conn.close()
+    return Scenario(name, changes)
+
+
+def get_node(data, name):
+    if name not in data.network_nodes:
+        raise Exception('Cannot find network node %s of the scenario' % name)
+    return data.network_nodes[name]
+
+
+def get_values(values, fields, base, description):
+    """ Values of an overlay record, a NULL value keeps the value of the base record
+        fields: attributes of the base record, base: None for a new record, which needs all of the values
+    """
+    if base is not None:
+        return [getattr(base, field) if value is None else value for value, field in zip(values, fields)]
+    missing = [field for value, field in zip(values, fields) if value is None]
+    if missing:
+        raise Exception('Missing %s of the new %s' % (', '.join(missing), description))
+    return values
+
+
+def apply_validity(data, operation, node, start, end):
+    """ Adding an interval to the validity of the node, deleting removes the intervals given before
+        A node without intervals is valid during the whole simulation.
+    """
+    node = get_node(data, node)
+    if operation == 'delete':
+        node.validity = []
+    else:
+        node.validity.append({'start': data.get_day(start), 'end': data.get_day(end)})
+    node.compile_validity()
+
+
+def find_route(data, source, destination, mode):
+    for route in get_node(data, source).route_starts:
+        if route.destination == destination and route.mode == mode:
+            return route
+    return None
+
+
+def apply_route(data, operation, source, destination, mode, costcenter):
+    """ Adding a route or overriding its cost center, the static costs of a new route are computed """
+    route = find_route(data, source, destination, mode)
+    if operation == 'delete':
+        if route is not None:
+            route.source_node.route_starts.remove(route)
+            route.destination_node.route_ends.remove(route)
+    elif route is not None:
+        route.costcenter = costcenter
+    else:
+        route = Route(source, destination, mode, costcenter)
+        route.source_node = get_node(data, source)
+        route.destination_node = get_node(data, destination)
+        route.transport_mode = data.transport_modes[mode]
+        data.compile_routes([route])
+        route.source_node.route_starts.append(route)
+        route.destination_node.route_ends.append(route)
+
+
+def apply_inventory(data, operation, material, node, quantity, price):
+    """ Adding or overriding an inventory, a missing quantity or price keeps the value of the existing inventory """
+    node = get_node(data, node)
+    if material not in data.materials:
+        raise Exception('Cannot find material %s of the scenario inventory at %s' % (material, node.name))
+    if operation == 'set':
+        if material in node.inventory:
+            quantity = quantity if quantity is not None else node.get_inventory(material)
+            price = price if price is not None else node.get_price(material)
+        elif quantity is None or price is None:
+            raise Exception('Missing quantity or price of the new inventory of %s at %s' % (material, node.name))
+        node.set_inventory(material, quantity, price)
+    elif material in node.inventory:
+        node.inventory.remove(material)
+
+
+def apply_demand(data, operation, customer, material, frequency, quantity_distribution, is_backlog, additional_trend,
+                 multiplicative_trend, duedate, waste_production):
+    """ Adding or overriding a demand, a missing field keeps the value of the existing demand """
+    node = get_node(data, customer)
+    if not isinstance(node, Customer):
+        raise Exception('Demand of %s is not a customer' % customer)
+    if material not in data.materials:
+        raise Exception('Cannot find material %s of the scenario demand of %s' % (material, customer))
+    if operation == 'set':
+        if quantity_distribution is not None:
+            if quantity_distribution not in data.distributions:
+                raise Exception('Cannot find distribution %s of the scenario demand of %s for %s' % (quantity_distribution, customer, material))
+            quantity_distribution = data.distributions[quantity_distribution]
+        values = get_values([frequency, quantity_distribution, is_backlog, additional_trend, multiplicative_trend, duedate, waste_production],
+                            ['frequency', 'quantity_distribution', 'is_backlog', 'additional_trend', 'multiplicative_trend', 'duedate', 'waste_production'],
+                            node.demand.get(material), 'demand of %s for %s' % (customer, material))
+        node.demand[material] = Demand(material, *values, data.streams.get_stream('demand', customer, material))
+    else:
+        node.demand.pop(material, None)
+
+
+def apply_produced_material(data, operation, node, material, cost, time, capacity_usage, price, property_id):
+    """ Adding or overriding a produced material, a missing field keeps the value of the existing one
+        A new produced material without operation properties has none.
+    """
+    node = get_node(data, node)
+    if not isinstance(node, ProductionSite):
+        raise Exception('Produced material of %s is not a production site' % node.name)
+    if material not in data.materials:
+        raise Exception('Cannot find material %s of the scenario production at %s' % (material, node.name))
+    if operation == 'set':
+        base = node.produced_materials.get(material)
+        properties = None
+        if property_id is not None:
+            if property_id not in data.operation_properties:
+                raise Exception('Cannot find operation properties %s of the production of %s at %s' % (property_id, material, node.name))
+            properties = data.operation_properties[property_id]
+        elif base is None:
+            properties = []
+        values = get_values([cost, time, capacity_usage, price, properties], ['cost', 'time', 'capacity_usage', 'price', 'properties'],
+                            base, 'production of %s at %s' % (material, node.name))
+        node.produced_materials[material] = ProducedMaterial(*values)
+    else:
+        node.produced_materials.pop(material, None)
+
+
+# Functions applying the records of the overlay tables
+APPLY = {
+    'Validity': apply_validity,
+    'Route': apply_route,
+    'Inventory': apply_inventory,
+    'Demand': apply_demand,
+    'ProducedMaterial': apply_produced_material,
+}
@@ -0,0 +1,86 @@
+"""
+Copyright   :   Copyright 2024, HUN-REN SZTAKI
+File name   :   shared_model.py
+Description :   Master data arrays shared by the processes of the COPROLOOPS simulation
+
+Revision history:
+Date            Author          Comment
+----------------------------------------------------------
+18/10/2026      SZTAKI          Initial version
+"""
+
+from multiprocessing import shared_memory
+import numpy as np
+import daily_demand
+import datastruct
+from log import Log
+from random_streams import RandomStreams
+
+# Alignment of the arrays in the shared memory block (bytes)
+ALIGNMENT = 64
+
+
+class SharedArrays:
+    """ Read-only NumPy arrays in one shared memory block
+        The parent process creates the block, the workers attach to it by its name and layout without copying.
+        layout: {array name: (offset, dtype, shape)}
+    """
+    def __init__(self, memory, layout):
+        self.memory = memory
+        self.layout = layout
+        self.arrays = dict()
+        for name, (offset, dtype, shape) in layout.items():
+            array = np.ndarray(shape, dtype=dtype, buffer=memory.buf, offset=offset)
+            array.flags.writeable = False
+            self.arrays[name] = array
+
+    @property
+    def name(self):
+        return self.memory.name
+
+    def close(self):
+        """ Detaching from the block, the arrays cannot be used afterwards """
+        self.arrays = dict()
+        self.memory.close()
+
+    def unlink(self):
+        """ Freeing the block, called by the parent process after the workers finished """
+        self.memory.unlink()
+
+
+def create(arrays):
+    """ Copying the arrays into a new shared memory block """
+    layout = dict()
+    size = 0
+    for name, array in arrays.items():
+        size = -(-size // ALIGNMENT) * ALIGNMENT
+        layout[name] = (size, array.dtype.str, array.shape)
+        size += array.nbytes
+    memory = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    for name, array in arrays.items():
+        offset, dtype, shape = layout[name]
+        np.copyto(np.ndarray(shape, dtype=dtype, buffer=memory.buf, offset=offset), array)
+    return SharedArrays(memory, layout)
+
+
+def attach(name, layout):
+    """ Attaching to the block created by the parent process """
+    return SharedArrays(shared_memory.SharedMemory(name=name), layout)
+
+
+def get_model_arrays(data):
+    """ Immutable arrays of a model: coordinates, validity dates, distance matrix, route table and demand parameters """
+    arrays = {'latitudes': data.latitudes, 'longitudes': data.longitudes, 'validity_nodes': data.validity_nodes,
+              'validity_dates': data.validity_dates, 'route_distances': data.route_table.distances,
+              'route_costs': data.route_table.costs}
+    if data.distances is not None:
+        arrays['distances'] = data.distances
+    customers, demands = daily_demand.get_demands(data)
+    arrays.update(daily_demand.get_demand_arrays(demands))
+    return arrays
+
+
+def create_model(database, starttime):
+    """ Reading the model once in the parent process and sharing its immutable arrays """
+    data = datastruct.DataStructure(database, starttime, None, Log(starttime), RandomStreams())
+    return create(get_model_arrays(data))
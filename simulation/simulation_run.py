@@ -0,0 +1,95 @@
+"""
+Copyright   :   Copyright 2024, HUN-REN SZTAKI
+File name   :   simulation_run.py
+Description :   A single, self-contained run of the COPROLOOPS simulation
+
+Revision history:
+Date            Author          Comment
+----------------------------------------------------------
+18/10/2026      SZTAKI          Initial version
+"""
+
+import datetime
+import datastruct
+import engine
+from daily_demand import DailyDemand
+from log import Log
+from network_nodes import DemandScheduler
+from random_streams import RandomStreams
+from scenario import read_scenario
+
+# Default simulation engine
+ENGINE = 'heap'
+# Default demand generation: 'event' (one event per demand) or 'daily' (vectorized daily time steps)
+DEMAND_MODE = 'event'
+
+
+class SimulationRun:
+    """ Simulation run owning its environment, model data, log and random number streams
+        Runs do not share any mutable state, so any number of them can be executed in one process
+        seed: seed of the random number streams (integer or numpy SeedSequence), None for a random seed
+              Runs with the same seed use common random numbers, even for different models
+        antithetic: using antithetic random numbers of the seed
+        log_policy: LogPolicy selecting the stored log entries, None stores all entries
+        log_sink: LogSink for streaming the log, None keeps the log in the memory
+        engine_name: simulation engine, 'heap' (lean callback kernel) or 'simpy' (SimPy environment), both give the same results
+        demand_mode: 'event' generates every demand as an event, 'daily' generates the demands of a day in one batch
+                     for large customer populations
+        shared: SharedArrays of the model (see shared_model), None reads all master data into the run
+        scenario: name of a scenario in the database or a Scenario read by scenario.read_scenario, its changes
+                  are applied on the base model (None: base model)
+        subnetwork: Subnetwork of the nodes and materials to simulate (None: whole network)
+    """
+    def __init__(self, database, horizon, starttime=None, seed=None, log_policy=None, log_sink=None, antithetic=False,
+                 engine_name=ENGINE, demand_mode=DEMAND_MODE, shared=None, scenario=None, subnetwork=None):
+        self.database = database
+        self.horizon = horizon
+        self.starttime = starttime if starttime is not None else datetime.datetime.today()
+        self.seed = seed
+        self.log_sink = log_sink
+        self.demand_mode = demand_mode
+        self.env = engine.create_engine(engine_name)
+        self.streams = RandomStreams(seed, antithetic)
+        self.log = Log(self.starttime, log_policy)
+        self.data = datastruct.DataStructure(database, self.starttime, self.env, self.log, self.streams, shared,
+                                             subnetwork)
+        if isinstance(scenario, str):
+            scenario = read_scenario(database, scenario)
+        self.scenario = scenario
+        if scenario is not None:
+            scenario.apply(self.data)
+
+    def run(self):
+        """ Running the simulation until the horizon and returning the KPI summary """
+        if self.log_sink is not None:
+            self.log.open_sink(self.log_sink)
+        # Scheduling the opening and closing of the nodes
+        self.data.schedule_validity()
+        # Starting the demands of the customers
+        if self.demand_mode == 'daily':
+            DailyDemand(self.data).start(self.data)
+        elif self.demand_mode == 'event':
+            scheduler = DemandScheduler()
+            for node in self.data.network_nodes.values():
+                if isinstance(node, datastruct.Customer):
+                    node.start(scheduler)
+            scheduler.start(self.data)
+        else:
+            raise Exception('Unknown demand mode: %s' % self.demand_mode)
+        try:
+            self.env.run(self.horizon)
+        finally:
+            self.log.close_sink()
+        return self.get_summary()
+
+    def store_results(self, store, scenario=None):
+        """ Storing the KPI summary in a ResultStore and returning the ID of the run
+            The scenario ID defaults to the name of the applied scenario
+        """
+        if scenario is None and self.scenario is not None:
+            scenario = self.scenario.name
+        return store.save(self.get_summary(), self.horizon, self.seed, scenario, self.starttime)
+
+    def get_summary(self):
+        """ KPIs of the cost centers, also available during the run """
+        return self.log.get_summary()
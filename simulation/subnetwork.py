@@ -0,0 +1,117 @@
+"""
+Copyright   :   Copyright 2024, HUN-REN SZTAKI
+File name   :   subnetwork.py
+Description :   Loading the part of the network relevant to a region or a material set for the COPROLOOPS simulation
+
+Revision history:
+Date            Author          Comment
+----------------------------------------------------------
+18/10/2026      SZTAKI          Initial version
+"""
+
+import sqlite3
+
+# Indexes of database/create.sql used by the selection, create_indexes adds them to older databases
+INDEXES = ['CREATE INDEX IF NOT EXISTS RouteSource ON Route(Source)',
+           'CREATE INDEX IF NOT EXISTS RouteDestination ON Route(Destination)',
+           'CREATE INDEX IF NOT EXISTS NetworkNodeCostCenter ON NetworkNode(CostCenter)',
+           'CREATE INDEX IF NOT EXISTS InventoryNetworkNode ON Inventory(NetworkNode)',
+           'CREATE INDEX IF NOT EXISTS DemandCustomer ON Demand(Customer, Material)',
+           'CREATE INDEX IF NOT EXISTS ProducedMaterialSite ON ProducedMaterial(ProductionSite, MaterialName)',
+           'CREATE INDEX IF NOT EXISTS DisassembledMaterialPlant ON DisassembledMaterial(RecoveryPlant)',
+           'CREATE INDEX IF NOT EXISTS InverseBOMPlant ON InverseBOM(RecoveryPlant, Product)',
+           'CREATE INDEX IF NOT EXISTS BOMComponent ON BOM(Component)']
+
+# Materials of the material filter with their components (BOM and inverse BOM closure)
+MATERIAL_CLOSURE = '''WITH RECURSIVE
+	Edge(Parent, Child) AS (SELECT Product, Component FROM main.BOM UNION SELECT Product, Component FROM main.InverseBOM),
+	Closure(Name) AS (SELECT Name FROM SelectedMaterial UNION SELECT Edge.Child FROM Edge JOIN Closure ON Edge.Parent = Closure.Name)
+INSERT OR IGNORE INTO SelectedMaterial SELECT Name FROM Closure'''
+
+# Nodes of the node filter with their suppliers (upstream, customers never supply) and the collection centers and
+# recovery plants receiving their returns (downstream). Only suppliers handling a selected material are followed.
+NODE_CLOSURE = '''WITH RECURSIVE
+	Edge(Node, Neighbor) AS (
+		SELECT r.Destination, r.Source FROM main.Route r
+		WHERE r.Source NOT IN (SELECT NetworkNode FROM main.Customer)
+		AND (r.Source IN (SELECT NetworkNode FROM main.CollectionCenter)
+			OR EXISTS (SELECT 1 FROM main.ProducedMaterial p JOIN SelectedMaterial m ON p.MaterialName = m.Name WHERE p.ProductionSite = r.Source)
+			OR EXISTS (SELECT 1 FROM main.Inventory i JOIN SelectedMaterial m ON i.Material = m.Name WHERE i.NetworkNode = r.Source)
+			OR EXISTS (SELECT 1 FROM main.InverseBOM b JOIN SelectedMaterial m ON b.Component = m.Name WHERE b.RecoveryPlant = r.Source))
+		UNION
+		SELECT r.Source, r.Destination FROM main.Route r
+		WHERE r.Destination IN (SELECT NetworkNode FROM main.CollectionCenter UNION SELECT NetworkNode FROM main.RecoveryPlant)),
+	Closure(Name) AS (SELECT Name FROM SelectedNode UNION SELECT Edge.Neighbor FROM Edge JOIN Closure ON Edge.Node = Closure.Name)
+INSERT OR IGNORE INTO SelectedNode SELECT Name FROM Closure'''
+
+# Temporary views shadowing the tables of the database, so DataStructure reads only the selected records
+NODE = 'IN (SELECT Name FROM SelectedNode)'
+MATERIAL = 'IN (SELECT Name FROM SelectedMaterial)'
+VIEWS = {
+    'NetworkNode': 'Name %s' % NODE,
+    'ProductionSite': 'NetworkNode %s' % NODE,
+    'DistributionCenter': 'NetworkNode %s' % NODE,
+    'Customer': 'NetworkNode %s' % NODE,
+    'CollectionCenter': 'NetworkNode %s' % NODE,
+    'RecoveryPlant': 'NetworkNode %s' % NODE,
+    'Validity': 'NetworkNode %s' % NODE,
+    'Route': 'Source %s AND Destination %s' % (NODE, NODE),
+    'Inventory': 'NetworkNode %s AND Material %s' % (NODE, MATERIAL),
+    'Demand': 'Customer %s AND Material %s' % (NODE, MATERIAL),
+    'Material': 'Name %s' % MATERIAL,
+    'BOM': 'Product %s' % MATERIAL,
+    'MaterialPropertyLink': 'MaterialName %s' % MATERIAL,
+    'ProducedMaterial': 'ProductionSite %s AND MaterialName %s' % (NODE, MATERIAL),
+    'DisassembledMaterial': 'RecoveryPlant %s AND Product %s' % (NODE, MATERIAL),
+    'InverseBOM': 'RecoveryPlant %s AND Product %s' % (NODE, MATERIAL),
+}
+
+
+class Subnetwork:
+    """ Filter of the network nodes and materials loaded from the database
+        nodes: names of the nodes
+        costcenters: the nodes of the cost centers
+        bounding_box: the nodes in (minimum latitude, minimum longitude, maximum latitude, maximum longitude)
+        materials: names of the materials, their components are also loaded (None: all materials)
+        The nodes matching any node criterion are loaded with their suppliers and the collection centers and recovery
+        plants of their returns. Without node criteria the customers demanding the materials are selected.
+    """
+    def __init__(self, nodes=None, costcenters=None, bounding_box=None, materials=None):
+        self.nodes = nodes
+        self.costcenters = costcenters
+        self.bounding_box = bounding_box
+        self.materials = materials
+
+    def select(self, conn):
+        """ Selecting the nodes and materials in temporary tables and shadowing the tables by filtered views """
+        with conn:
+            conn.execute('CREATE TEMP TABLE SelectedMaterial (Name TEXT PRIMARY KEY) WITHOUT ROWID')
+            conn.execute('CREATE TEMP TABLE SelectedNode (Name TEXT PRIMARY KEY) WITHOUT ROWID')
+            if self.materials is None:
+                conn.execute('INSERT INTO SelectedMaterial SELECT Name FROM main.Material')
+            else:
+                conn.executemany('INSERT OR IGNORE INTO SelectedMaterial VALUES (?)', [(material,) for material in self.materials])
+                conn.execute(MATERIAL_CLOSURE)
+            if self.nodes is None and self.costcenters is None and self.bounding_box is None:
+                conn.execute('INSERT OR IGNORE INTO SelectedNode SELECT Customer FROM main.Demand WHERE Material %s' % MATERIAL)
+            if self.nodes is not None:
+                conn.executemany('INSERT OR IGNORE INTO SelectedNode VALUES (?)', [(node,) for node in self.nodes])
+            if self.costcenters is not None:
+                conn.executemany('INSERT OR IGNORE INTO SelectedNode SELECT Name FROM main.NetworkNode WHERE CostCenter = ?',
+                                 [(costcenter,) for costcenter in self.costcenters])
+            if self.bounding_box is not None:
+                conn.execute('INSERT OR IGNORE INTO SelectedNode SELECT Name FROM main.NetworkNode '
+                             'WHERE Latitude BETWEEN ? AND ? AND Longitude BETWEEN ? AND ?',
+                             (self.bounding_box[0], self.bounding_box[2], self.bounding_box[1], self.bounding_box[3]))
+            conn.execute(NODE_CLOSURE)
+            for table, condition in VIEWS.items():
+                conn.execute('CREATE TEMP VIEW %s AS SELECT * FROM main.%s WHERE %s' % (table, table, condition))
+
+
+def create_indexes(database):
+    """ Adding the indexes of the selection to a database created with an older create.sql """
+    conn = sqlite3.connect(database)
+    with conn:
+        for index in INDEXES:
+            conn.execute(index)
+    conn.close()